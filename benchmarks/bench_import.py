@@ -0,0 +1,50 @@
+"""Cold `import lhctodd` wall time, measured in fresh interpreters
+
+    python benchmarks/bench_import.py [--repeat N] [--max-ms MS]
+
+Exits with a non-zero status when the median import time exceeds --max-ms.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY = ("matplotlib", "scipy", "pandas", "prettytable", "lmdb")
+
+_PROBE = (
+    "import sys, time; t = time.perf_counter(); import lhctodd; "
+    "print(time.perf_counter() - t); "
+    f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+)
+
+
+def measure(repeat=10):
+    """Import times in seconds and heavy modules loaded by `import lhctodd`
+    """
+    times, loaded = [], set()
+    for _ in range(repeat):
+        lines = subprocess.run(
+            [sys.executable, "-c", _PROBE],
+            check=True, capture_output=True, text=True
+        ).stdout.splitlines()
+        times.append(float(lines[0]))
+        loaded.update(filter(None, lines[1].split(",")))
+    return times, sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    times, loaded = measure(args.repeat)
+    median = statistics.median(times) * 1e3
+    print(f"import lhctodd: median {median:.1f} ms, min {min(times) * 1e3:.1f} ms over {args.repeat} runs")
+    print(f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+    if args.max_ms is not None and median > args.max_ms:
+        sys.exit(f"import time {median:.1f} ms exceeds {args.max_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
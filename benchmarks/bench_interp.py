@@ -0,0 +1,33 @@
+"""Per-call latency of DD.sigma: log-log engine against scipy interp1d
+
+    python benchmarks/bench_interp.py
+"""
+import timeit
+
+import numpy as np
+from scipy import interpolate
+
+import lhctodd
+from lhctodd.interp import loglog
+
+
+def best_of(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    limit = lhctodd.DD(arxiv="1805.12562").data()
+    engines = {
+        "loglog": loglog(limit[:,0], limit[:,1]),
+        "interp1d": interpolate.interp1d(limit[:,0], limit[:,1], fill_value="extrapolate"),
+    }
+    masses = np.logspace(0, 4, 1_000_000)
+    print(f"{'engine':<10} {'scalar (us)':>12} {'1e6 array (ms)':>16}")
+    for name, func in engines.items():
+        scalar = best_of(lambda: func(100.0), number=10000)
+        array = best_of(lambda: func(masses), number=3)
+        print(f"{name:<10} {scalar * 1e6:>12.2f} {array * 1e3:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Render time and file size of dense limit plots
+
+Draws ``--limits`` synthetic limits of ``--points`` points and one LHC
+curve of ``--lhc-points`` points, once with one ``ax.plot`` per curve and
+once through ``lhctodd.plotting`` (single LineCollection, LTTB decimation),
+and saves both as PDF and PNG.
+
+    python benchmarks/bench_plot.py --limits 200 --points 10000 --lhc-points 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from lhctodd.plotting import plot_curves, setup_axes
+
+
+def synthetic_curves(n_limits, points, lhc_points, seed=0):
+    rng = np.random.default_rng(seed)
+    curves = []
+    for i in range(n_limits):
+        mass = np.geomspace(10 ** rng.uniform(-1, 1), 10 ** rng.uniform(2, 4), points)
+        sigma = 1e-46 * (mass / 30) ** 1.5 + 1e-44 * (mass / 3) ** -6 + 1e-47 * rng.uniform(0.5, 2)
+        curves.append((mass, sigma * (1 + 0.05 * rng.standard_normal(points)), f"limit {i}"))
+    mass = np.geomspace(1, 2000, lhc_points)
+    curves.append((mass, 1e-43 * (mass / 100) ** 2 * (1 + 0.3 * np.sin(np.log(mass) * 20)), "LHC"))
+    return curves
+
+
+def naive(curves, ax):
+    for mass, sigma, label in curves:
+        ax.plot(mass, sigma, label=label)
+        setup_axes(ax, "SI")
+
+
+def batched(curves, ax):
+    plot_curves(curves, ax, "SI")
+
+
+def measure(draw, curves, directory, name):
+    result = {}
+    for fmt in ("pdf", "png"):
+        start = time.perf_counter()
+        fig, ax = plt.subplots(figsize=(8, 6))
+        draw(curves, ax)
+        path = os.path.join(directory, f"{name}.{fmt}")
+        fig.savefig(path, dpi=100)
+        plt.close(fig)
+        result[fmt] = (time.perf_counter() - start, os.path.getsize(path))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limits", type=int, default=200)
+    parser.add_argument("--points", type=int, default=10_000)
+    parser.add_argument("--lhc-points", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    curves = synthetic_curves(args.limits, args.points, args.lhc_points)
+    print(f"{'backend':<10} {'pdf (s)':>8} {'pdf (kB)':>10} {'png (s)':>8} {'png (kB)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, draw in (("naive", naive), ("batched", batched)):
+            result = measure(draw, curves, directory, name)
+            print(
+                f"{name:<10} {result['pdf'][0]:>8.2f} {result['pdf'][1] / 1e3:>10.0f}"
+                f" {result['png'][0]:>8.2f} {result['png'][1] / 1e3:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
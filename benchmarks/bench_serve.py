@@ -0,0 +1,84 @@
+"""Latency and throughput of ``lhctodd serve`` under concurrent load
+
+Starts the server in-process on a free port and drives it with a local
+asyncio load generator over keep-alive connections. Every request asks for
+``--masses`` random masses of one of a few limits, so that the response
+cache only helps when ``--repeat`` makes requests identical.
+
+    python benchmarks/bench_serve.py --connections 64 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+import lhctodd
+from lhctodd.serve import limit_server
+
+
+async def client(port, requests, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for body in requests:
+        start = time.perf_counter()
+        writer.write(
+            f"POST /sigma HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status = await reader.readline()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        assert status.split()[1] == b"200", status
+    writer.close()
+
+
+async def run(args):
+    server = limit_server(cache_size=args.cache_size)
+    listening = await server.start(port=0)
+    port = listening.sockets[0].getsockname()[1]
+
+    rng = np.random.default_rng(0)
+    ids = lhctodd.registry.keys()[:args.limits]
+    bodies = [
+        json.dumps({"id": int(rng.choice(ids)), "mass": rng.uniform(5, 1000, args.masses).tolist()}).encode()
+        for _ in range(max(args.connections * args.requests // args.repeat, 1))
+    ]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(port, [bodies[(r * args.connections + c) % len(bodies)] for r in range(args.requests)], latencies)
+        for c in range(args.connections)
+    ])
+    wall = time.perf_counter() - start
+    listening.close()
+    await listening.wait_closed()
+
+    stats = await server.stats({}, b"")
+    latencies = np.array(latencies) * 1e3
+    print(f"{len(latencies)} requests on {args.connections} connections in {wall:.2f} s: {len(latencies) / wall:.0f} req/s")
+    print(f"latency (ms): p50 {np.percentile(latencies, 50):.2f}  p90 {np.percentile(latencies, 90):.2f}  p99 {np.percentile(latencies, 99):.2f}")
+    print(f"{stats['requests']} evaluations in {stats['batches']} batches, {stats['cache_hits']} cache hits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=50, help="requests per connection")
+    parser.add_argument("--masses", type=int, default=100, help="masses per request")
+    parser.add_argument("--limits", type=int, default=3, help="number of distinct limits queried")
+    parser.add_argument("--repeat", type=int, default=1, help="times each distinct request is sent")
+    parser.add_argument("--cache-size", type=int, default=1024)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
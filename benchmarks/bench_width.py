@@ -0,0 +1,39 @@
+"""Tabulated against analytic mediator widths
+
+Time of the total widths on 10^6 mediator masses with both backends, and
+maximum relative difference on those masses.
+
+    python benchmarks/bench_width.py
+"""
+import timeit
+
+import numpy as np
+
+from lhctodd.theory import width
+
+
+def best_of(func, number=1, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    start = timeit.default_timer()
+    table = width.tabulated()
+    print(f"tables loaded in {timeit.default_timer() - start:.2f} s")
+
+    med_mass = np.geomspace(10, 5000, 1_000_000)
+    chi_mass = np.full_like(med_mass, 50.0)
+    totals = ("vector_total", "axial_total", "scalar_total", "pseudo_scalar_total")
+    print(f"{'width':<20} {'analytic (ms)':>14} {'tabulated (ms)':>15} {'speedup':>8} {'max rel diff':>13}")
+    for name in totals:
+        analytic = getattr(width, name)
+        tabulated = getattr(table, name)
+        exact = analytic(med_mass, chi_mass)
+        diff = np.max(np.abs(tabulated(med_mass, chi_mass) - exact) / exact)
+        slow = best_of(lambda: analytic(med_mass, chi_mass))
+        fast = best_of(lambda: tabulated(med_mass, chi_mass))
+        print(f"{name:<20} {slow * 1e3:>14.1f} {fast * 1e3:>15.1f} {slow / fast:>7.1f}x {diff:>13.2g}")
+
+
+if __name__ == "__main__":
+    main()
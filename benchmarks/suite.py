@@ -0,0 +1,248 @@
+"""Benchmark suite of database access, interpolation, widths and translation
+
+Every case runs on synthetic limit databases of ``--sizes`` limits and
+on mass arrays of ``--masses`` points, cold (empty registry cache, width
+tables read back from disk) and warm. Results are written as JSON and can
+be compared with an earlier run, the suite then fails when the median time
+of a case grows by more than ``--threshold``.
+
+    python benchmarks/suite.py --output base.json
+    python benchmarks/suite.py --output new.json --compare base.json --threshold 0.25
+    python benchmarks/suite.py --quick --filter "width|sigma"
+
+``plot_all`` only runs on databases of at most ``--max-plot`` limits and
+``from_csv`` on files of at most ``--max-csv`` rows, both being dominated
+by matplotlib and text parsing beyond that. The synthetic databases carry
+no stored envelopes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import lhctodd
+from lhctodd import tabulate
+from lhctodd.index import add_record, open_indexes, record_key
+from lhctodd.registry import open_env, registry
+from lhctodd.theory import width
+from lhctodd.tools import dd_format
+
+
+EXPERIMENTS = ("XENON", "LUX", "PandaX", "CRESST", "DarkSide", "PICO", "SuperCDMS", "DEAP")
+TOTALS = ("vector_total", "axial_total", "scalar_total", "pseudo_scalar_total")
+
+
+def synthetic_db(path, n_limits, points=50, seed=0):
+    """Database of ``n_limits`` random power-law limits, half SI and half SD
+    """
+    rng = np.random.default_rng(seed)
+    env = open_env(path, write=True)
+    env.set_mapsize(max(env.info()["map_size"], n_limits * (1200 + 16 * points) + (64 << 20)))
+    with env.begin(write=True) as txn:
+        dbs = open_indexes(env, txn=txn, create=True)
+        for i in range(n_limits):
+            low = 10 ** rng.uniform(-1, 2)
+            mass = np.geomspace(low, low * 10 ** rng.uniform(1, 4), points)
+            sigma = 10 ** rng.uniform(-47, -40) * (mass / low) ** rng.uniform(-1, 2)
+            expr = EXPERIMENTS[i % len(EXPERIMENTS)]
+            meta = {
+                "type": ("SI", "SD")[i % 2], "expr": expr, "name": f"{expr} {i}",
+                "cite": f"{1000 + i // 100}.{i % 100:05}", "year": 2000 + i % 25,
+            }
+            record = dd_format(np.column_stack([mass, sigma]), meta)
+            key = record_key(1000 + i)
+            txn.put(key, record.to_bytes())
+            add_record(txn, dbs, key, record)
+    return path
+
+
+def run(func, setup=None, repeat=5, min_time=0.2):
+    """Times of ``func`` in seconds, ``setup`` runs untimed before each call
+
+    Runs at least once and at most ``repeat`` times, stopping early once
+    ``min_time`` seconds were spent in the timed calls after the first one.
+    """
+    times = []
+    while len(times) < repeat:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        if len(times) > 1 and sum(times[1:]) > min_time:
+            break
+    return times
+
+
+def cases(workdir, sizes, masses, max_plot, max_csv):
+    """Yield ``(name, params, func, setup)`` for every benchmark case
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    def cold():
+        registry.invalidate()
+
+    for n_limits in sizes:
+        path = workdir / f"db-{n_limits}"
+        if not path.exists():
+            synthetic_db(path, n_limits)
+
+        def switch(path=path):
+            registry.reload(path)
+
+        def warm(path=path):
+            if registry.path != path:
+                registry.reload(path)
+
+        ids = list(range(1000, 1000 + min(n_limits, 100)))
+        params = {"limits": n_limits}
+        yield "registry.open", params, (lambda: registry.get(1000)), switch
+
+        def build(ids=ids):
+            for limit_id in ids:
+                lhctodd.DD(limit_id).sigma(100.0)
+
+        yield "DD.__init__.cold", dict(params, calls=len(ids)), build, lambda: (warm(), cold())
+        yield "DD.__init__.warm", dict(params, calls=len(ids)), build, warm
+
+        def listing():
+            with contextlib.redirect_stdout(io.StringIO()):
+                lhctodd.list()
+
+        yield "list", params, listing, warm
+        yield "query", params, (lambda: lhctodd.query(type="SI", year_min=2010)), warm
+
+        stack_masses = np.geomspace(1, 1e4, 1000)
+        yield "LimitStack.sigma", dict(params, masses=1000), \
+            (lambda ids=ids: lhctodd.LimitStack(ids).sigma(stack_masses)), warm
+
+        if n_limits <= max_plot:
+            def plot():
+                fig, ax = plt.subplots()
+                lhctodd.plot_all("SI", ax=ax)
+                plt.close(fig)
+
+            yield "plot_all", params, plot, warm
+
+    registry.reload(lhctodd.__data_path__ / "darkmatter-data")
+    limit = lhctodd.DD(1006)
+    table_dir = workdir / "widths"
+    tabulate.width_table.load(cache_dir=table_dir)
+
+    def load_tables():
+        tabulate._loaded.clear()
+        tabulate.width_table.load(cache_dir=table_dir)
+
+    yield "width_table.load.cold", {}, load_tables, None
+
+    for n_masses in masses:
+        params = {"masses": n_masses}
+        mass = np.geomspace(1, 1e4, n_masses)
+        chi_mass = mass / 3
+        yield "DD.sigma", params, (lambda mass=mass: limit.sigma(mass)), None
+        table = tabulate.width_table.load(cache_dir=table_dir)
+        for name in TOTALS:
+            yield f"width.{name}", params, (lambda f=getattr(width, name), m=mass, c=chi_mass: f(m, c)), None
+            yield f"width_table.{name}", params, \
+                (lambda f=getattr(table, name), m=mass, c=chi_mass: f(m, c)), None
+
+        if n_masses <= max_csv:
+            filename = workdir / f"scan-{n_masses}.csv"
+            if not filename.exists():
+                np.savetxt(filename, np.column_stack([mass, chi_mass]), delimiter=",")
+            yield "SI.from_csv", params, (lambda f=filename: lhctodd.SI().from_csv(f)), None
+            yield "SD.from_csv", params, (lambda f=filename: lhctodd.SD().from_csv(f)), None
+
+
+def key(name, params):
+    return name + "".join(f"[{k}={v}]" for k, v in params.items())
+
+
+def environment():
+    return {
+        "lhctodd": lhctodd.__version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Cases of ``results`` whose median time grew by more than ``threshold``
+    relative to ``baseline``
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000])
+    parser.add_argument("--masses", type=int, nargs="+", default=[1, 1000, 100_000, 10_000_000])
+    parser.add_argument("--quick", action="store_true", help="sizes 10 1000, masses 1 1000 100000")
+    parser.add_argument("--filter", default=None, help="regular expression on case names")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-plot", type=int, default=1000)
+    parser.add_argument("--max-csv", type=int, default=1_000_000)
+    parser.add_argument("--workdir", default=None, help="keeps the synthetic databases between runs")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    parser.add_argument("--compare", default=None, help="JSON results of a baseline run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slow down")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.masses = [10, 1000], [1, 1000, 100_000]
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir is None:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        else:
+            workdir = Path(args.workdir)
+            workdir.mkdir(parents=True, exist_ok=True)
+
+        results = {}
+        print(f"{'case':<60} {'median':>10} {'min':>10} {'runs':>5}")
+        for name, params, func, setup in cases(workdir, args.sizes, args.masses, args.max_plot, args.max_csv):
+            if args.filter and not re.search(args.filter, name):
+                continue
+            times = run(func, setup, args.repeat)
+            results[key(name, params)] = {
+                "name": name, "params": params, "median": statistics.median(times),
+                "min": min(times), "runs": len(times),
+            }
+            print(f"{key(name, params):<60} {statistics.median(times) * 1e3:>8.2f}ms {min(times) * 1e3:>8.2f}ms {len(times):>5}")
+        registry.reload(lhctodd.__data_path__ / "darkmatter-data")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline")
+        if regressions:
+            sys.exit(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
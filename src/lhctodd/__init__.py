@@ -5,10 +5,7 @@ __email__ = 'yhaddad@cern.ch'
 __version__ = '0.1.0'
 
 import os
-import lmdb
-import pickle
 from pathlib import Path
-from prettytable import PrettyTable
 
 from . import theory
 from .tools import dd_format
@@ -17,34 +14,44 @@ from .model import DD
 from .model import SI
 from .model import SD
 from .model import plot_all
+from .registry import registry
+from .stack import LimitStack
+from . import pack
+from .pack import to_frame
+from .world import envelope
+from .compare import compare
+from . import instrument
+from . import inverse
+from .instrument import stats
 
 
 def list(search=None):
-    env = lmdb.open(str(__data_path__ / f"darkmatter-data"), readonly=True)
+    from prettytable import PrettyTable
     output = PrettyTable()
     output.field_names = ["id", "type", "Experiment", "arXiv"]
-    with env.begin() as txn:
-        for key, _ in txn.cursor():
-            raw = txn.get(key)
-            data = pickle.loads(raw)
-            if search:
-                if search in data.__dict__.values():
-                    output.add_row([
-                        int(key.decode()),
-                        data.type,
-                        data.expr,
-                        data.cite
-                    ])
-
-            else:
-                output.add_row([
-                    int(key.decode()),
-                    data.type,
-                    data.expr,
-                    data.cite
-                ])
-    env.close()
+    ids = registry.search(search) if search else registry.keys()
+    for limit_id in ids:
+        data = registry.get(limit_id)
+        output.add_row([
+            limit_id,
+            data.type,
+            data.expr,
+            data.cite
+        ])
     print(output)
 
 
-__all__ = ["model", "DD", "SI", "SD", "list"]
+def query(type=None, expr=None, cite=None, name=None,
+          year=None, year_min=None, year_max=None):
+    """Ids of the limits matching the given metadata, read from the database
+    indexes without decoding the limits themselves
+
+    >>> lhctodd.query(type="SI", expr="XENON", year_min=2018)
+    [1006]
+    """
+    return registry.query(
+        type=type, expr=expr, cite=cite, name=name,
+        year=year, year_min=year_min, year_max=year_max
+    )
+
+__all__ = ["model", "DD", "SI", "SD", "list", "query", "registry", "LimitStack", "to_frame", "pack", "envelope", "compare", "instrument", "stats", "inverse"]
@@ -0,0 +1,192 @@
+"""Translate many LHC limit files in one go, optionally on a process pool
+
+A manifest lists one job per line/entry with the input file, the model
+(``SI`` or ``SD``) and the couplings used to extract the limit::
+
+    [
+      {"input": "EXO-19-003-SD-90CL.csv", "model": "SD", "g_chi": 1.0, "g_quark": 0.25},
+      {"input": "EXO-19-003-SI-90CL.csv", "model": "SI", "g_chi": 1.0, "g_quark": 0.25,
+       "output": "monoz-si.csv"}
+    ]
+
+or the same fields as the columns of a CSV file. Every job writes its own
+output, failures are reported per job without stopping the others, and an
+``index.json`` summary is written next to the outputs, in manifest order.
+
+    python -m lhctodd.batch manifest.json -o translated/ -j 8
+"""
+from .model import MODELS
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+_defaults = {"model": "SI", "g_chi": 1.0, "g_quark": 0.25, "g_lepton": 0.0, "delimiter": ",", "output": None}
+
+
+def load_manifest(path):
+    """List of job dictionaries from a JSON or CSV manifest, with defaults
+    filled in and relative paths resolved against the manifest directory
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        with open(path) as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries["jobs"]
+    else:
+        with open(path, newline="") as f:
+            entries = [row for row in csv.DictReader(f)]
+
+    jobs = []
+    for entry in entries:
+        job = dict(_defaults)
+        job.update({key: value for key, value in entry.items() if value not in (None, "")})
+        if "input" not in job:
+            raise ValueError(f"manifest entry without input file: {entry}")
+        if job["model"] not in MODELS:
+            raise ValueError(f"unknown model {job['model']!r}, use one of {tuple(MODELS)}")
+        for coupling in ("g_chi", "g_quark", "g_lepton"):
+            job[coupling] = float(job[coupling])
+        job["input"] = str(path.parent / job["input"])
+        jobs.append(job)
+    return jobs
+
+
+def _output_name(index, job, fmt):
+    stem = Path(job["input"]).name.split(".")[0]
+    return f"{index:04d}-{stem}-{job['model']}.{fmt}"
+
+
+def run_job(job, chunk_size=1_000_000):
+    """Translate one manifest entry, never raises
+
+    Returns the job with ``rows``, ``seconds``, ``status`` ("ok" or "error")
+    and ``error`` filled in.
+    """
+    result = dict(job, rows=0, status="ok", error=None)
+    start = time.perf_counter()
+    try:
+        model = MODELS[job["model"]](
+            g_chi=job["g_chi"], g_quark=job["g_quark"], g_lepton=job["g_lepton"]
+        )
+        result["rows"] = model.translate(
+            job["input"], job["output"], chunk_size=chunk_size, delimiter=job["delimiter"]
+        )
+    except Exception as err:
+        result["status"] = "error"
+        result["error"] = f"{type(err).__name__}: {err}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _report(done, total, result, stream):
+    if result["status"] == "ok":
+        rate = result["rows"] / result["seconds"] if result["seconds"] > 0 else float("inf")
+        status = f"ok {result['rows']} rows in {result['seconds']:.2f} s ({rate:.3g} rows/s)"
+    else:
+        status = f"FAILED {result['error']}"
+    print(f"[{done}/{total}] {result['input']} -> {result['output']}: {status}", file=stream)
+
+
+def translate_batch(jobs, output_dir, processes=None, chunk_size=1_000_000, fmt="npy", progress=sys.stderr):
+    """Run every job of a manifest and write the summary index
+
+    Parameters
+    ----------
+    jobs: manifest path or list of job dictionaries (see ``load_manifest``)
+    output_dir: directory of the outputs, relative output names included, and of ``index.json``
+    processes: size of the process pool, jobs run in this process if None
+    chunk_size: rows translated at once in each job
+    fmt: extension of the default output names, "npy", "csv" or "csv.gz"
+    progress: stream receiving one line per finished job and the final timing report, None to disable
+
+    Returns the per-job results, in manifest order.
+    """
+    if isinstance(jobs, (str, os.PathLike)):
+        jobs = load_manifest(jobs)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = [dict(_defaults, **job) for job in jobs]
+    for index, job in enumerate(jobs):
+        job["index"] = index
+        if job["output"] is None:
+            job["output"] = _output_name(index, job, fmt)
+        job["output"] = str(output_dir / job["output"])
+
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    if processes is None:
+        for done, job in enumerate(jobs, 1):
+            results[job["index"]] = result = run_job(job, chunk_size)
+            if progress is not None:
+                _report(done, len(jobs), result, progress)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = {pool.submit(run_job, job, chunk_size): job for job in jobs}
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as err:
+                    # the worker died (BrokenProcessPool) or the result could not be sent back
+                    result = dict(futures[future], rows=0, seconds=0.0, status="error",
+                                  error=f"{type(err).__name__}: {err}")
+                results[result["index"]] = result
+                if progress is not None:
+                    _report(done, len(jobs), result, progress)
+    wall = time.perf_counter() - start
+
+    summary = {
+        "wall_seconds": wall,
+        "job_seconds": sum(result["seconds"] for result in results),
+        "rows": sum(result["rows"] for result in results),
+        "failed": sum(result["status"] != "ok" for result in results),
+        "processes": processes,
+        "jobs": results,
+    }
+    with open(output_dir / "index.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+    if progress is not None:
+        speedup = summary["job_seconds"] / wall if wall > 0 else float("nan")
+        print(
+            f"{len(results)} jobs ({summary['failed']} failed), {summary['rows']} rows "
+            f"in {wall:.2f} s: {summary['rows'] / wall if wall > 0 else float('inf'):.3g} rows/s, "
+            f"{speedup:.2f}x parallel speedup",
+            file=progress
+        )
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument("manifest", help="JSON or CSV manifest of the files to translate")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory of the outputs and of index.json")
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count(), help="size of the process pool, 0 to run serially")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows translated at once")
+    parser.add_argument("--format", default="npy", choices=("npy", "csv", "csv.gz"), help="format of the default output names")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report progress")
+
+
+def run(args):
+    results = translate_batch(
+        args.manifest,
+        args.output_dir,
+        processes=args.processes or None,
+        chunk_size=args.chunk_size,
+        fmt=args.format,
+        progress=None if args.quiet else sys.stderr,
+    )
+    return int(any(result["status"] != "ok" for result in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate a manifest of LHC limit files into DM-nucleon cross-sections")
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
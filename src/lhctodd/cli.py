@@ -0,0 +1,226 @@
+"""``lhctodd`` command line interface
+
+    lhctodd list [--type SI] [--expr XENON] [--format table|json|csv]
+    lhctodd show 1006
+    lhctodd sigma 1006 10 100 1000
+    lhctodd envelope --type SI --range 1 1000 50
+    lhctodd translate limit.csv limit-dd.npy --model SD --g-quark 0.25
+    lhctodd batch manifest.json -o translated/ -j 8
+    lhctodd ingest new-limits/
+    lhctodd export limits.npz --type SI
+    lhctodd serve --port 8080
+
+Only the modules a subcommand needs are imported: querying limits never
+loads matplotlib, scipy or pandas.
+"""
+import argparse
+import csv
+import json
+import sys
+
+from .tools import json_number, record_metadata
+
+
+def _emit(rows, columns, fmt, stream=None):
+    stream = stream or sys.stdout
+    if fmt == "json":
+        json.dump([{c: json_number(row[c]) for c in columns} for row in rows], stream)
+        stream.write("\n")
+    elif fmt == "csv":
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([[row[c] for c in columns] for row in rows])
+    else:
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = columns
+        for row in rows:
+            table.add_row([row[c] for c in columns])
+        print(table, file=stream)
+
+
+_metadata_columns = ["id", "type", "expr", "name", "cite", "year"]
+
+
+def _list(args):
+    from .registry import registry
+    if args.search is not None:
+        ids = registry.search(args.search)
+    else:
+        ids = registry.query(
+            type=args.type, expr=args.expr, cite=args.cite, name=args.name,
+            year_min=args.year_min, year_max=args.year_max
+        )
+    rows = [record_metadata(limit_id, registry.get(limit_id)) for limit_id in ids]
+    _emit(rows, _metadata_columns, args.format)
+
+
+def _show(args):
+    from .registry import registry
+    record = registry.get(args.id)
+    limit = record.get_limit()
+    if args.format == "json":
+        output = record_metadata(args.id, record)
+        output.update(mass=limit[:,0].tolist(), sigma=limit[:,1].tolist())
+        json.dump(output, sys.stdout)
+        sys.stdout.write("\n")
+    else:
+        rows = [dict(mass=mass, sigma=sigma) for mass, sigma in limit[:,:2].tolist()]
+        _emit(rows, ["mass", "sigma"], args.format)
+
+
+def _sigma(args):
+    from .registry import registry
+    func = registry.interpolator(args.id)
+    rows = [dict(id=args.id, mass=mass, sigma=func(mass, args.extrapolate)) for mass in args.masses]
+    _emit(rows, ["id", "mass", "sigma"], args.format)
+
+
+def _masses(args):
+    import numpy as np
+    if args.range is not None:
+        low, high, n = args.range
+        return np.geomspace(low, high, int(n))
+    return np.asarray(args.masses, dtype=np.float64)
+
+
+def _envelope(args):
+    from .stack import LimitStack
+    stack = LimitStack(type=args.type)
+    mass = _masses(args)
+    best, winner = stack.envelope(mass)
+    expr = dict(zip(stack.ids.tolist(), stack.expr))
+    rows = [
+        dict(mass=m, sigma=s, id=i, expr=expr.get(i))
+        for m, s, i in zip(mass.tolist(), best.tolist(), winner.tolist())
+    ]
+    _emit(rows, ["mass", "sigma", "id", "expr"], args.format)
+
+
+def _translate(args):
+    from .model import MODELS
+    model = MODELS[args.model](
+        g_chi=args.g_chi, g_quark=args.g_quark, g_lepton=args.g_lepton
+    )
+    rows = model.translate(
+        args.input, args.output,
+        chunk_size=args.chunk_size, delimiter=args.delimiter, skiprows=args.skiprows
+    )
+    print(f"{args.input} -> {args.output}: {rows} rows", file=sys.stderr)
+
+
+def _batch(args):
+    from . import batch
+    return batch.run(args)
+
+
+def _ingest(args):
+    from .ingest import ingest
+    summary = ingest(args.source, args.db)
+    json.dump(summary, sys.stdout)
+    sys.stdout.write("\n")
+
+
+def _export(args):
+    from .pack import export_pack
+    count = export_pack(args.output, type=args.type, expr=args.expr)
+    print(f"{count} limits -> {args.output}", file=sys.stderr)
+
+
+def _serve(args):
+    from .serve import limit_server
+    limit_server(cache_size=args.cache_size).serve(args.host, args.port)
+
+
+def parser():
+    main_parser = argparse.ArgumentParser(
+        prog="lhctodd",
+        description="Query direct detection limits and translate LHC limits into DM-nucleon cross-sections"
+    )
+    commands = main_parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    cmd = commands.add_parser("list", help="list the limits of the database")
+    cmd.add_argument("--type", help="SI or SD")
+    cmd.add_argument("--expr", help="experiment name prefix")
+    cmd.add_argument("--name", help="limit name prefix")
+    cmd.add_argument("--cite", help="arXiv id prefix")
+    cmd.add_argument("--year-min", type=int)
+    cmd.add_argument("--year-max", type=int)
+    cmd.add_argument("--search", help="exact value of any metadata field, as lhctodd.list(search)")
+    cmd.add_argument("--format", choices=("table", "json", "csv"), default="table")
+    cmd.set_defaults(func=_list)
+
+    cmd = commands.add_parser("show", help="metadata and points of a limit")
+    cmd.add_argument("id", type=int)
+    cmd.add_argument("--format", choices=("json", "csv"), default="json")
+    cmd.set_defaults(func=_show)
+
+    cmd = commands.add_parser("sigma", help="cross-section of a limit at the given masses")
+    cmd.add_argument("id", type=int)
+    cmd.add_argument("masses", type=float, nargs="+", help="DM masses (GeV)")
+    cmd.add_argument("--extrapolate", choices=("power", "clamp", "nan"), default="power")
+    cmd.add_argument("--format", choices=("json", "csv"), default="json")
+    cmd.set_defaults(func=_sigma)
+
+    cmd = commands.add_parser("envelope", help="strongest limit of a type at each mass")
+    cmd.add_argument("--type", default="SI", help="SI or SD")
+    masses = cmd.add_mutually_exclusive_group(required=True)
+    masses.add_argument("--masses", type=float, nargs="+", help="DM masses (GeV)")
+    masses.add_argument("--range", type=float, nargs=3, metavar=("MIN", "MAX", "N"), help="N log-spaced masses")
+    cmd.add_argument("--format", choices=("json", "csv"), default="json")
+    cmd.set_defaults(func=_envelope)
+
+    cmd = commands.add_parser("translate", help="translate a 2D LHC limit file")
+    cmd.add_argument("input", help="(m_med, m_chi) limit, .npy or csv/txt, optionally gzipped")
+    cmd.add_argument("output", help=".npy or csv/txt output of (sigma, m_chi)")
+    cmd.add_argument("--model", choices=("SI", "SD"), default="SI")
+    cmd.add_argument("--g-chi", type=float, default=1.0)
+    cmd.add_argument("--g-quark", type=float, default=0.25)
+    cmd.add_argument("--g-lepton", type=float, default=0.0)
+    cmd.add_argument("--chunk-size", type=int, default=1_000_000)
+    cmd.add_argument("--delimiter", default=",")
+    cmd.add_argument("--skiprows", type=int, default=0)
+    cmd.set_defaults(func=_translate)
+
+    from .batch import add_arguments
+    cmd = commands.add_parser("batch", help="translate every entry of a manifest on a process pool")
+    add_arguments(cmd)
+    cmd.set_defaults(func=_batch)
+    cmd = commands.add_parser("ingest", help="validate and add limit files to the database")
+    cmd.add_argument("source", help="manifest JSON, or directory of limit files with .json metadata sidecars")
+    cmd.add_argument("--db", help="LMDB database, defaults to the shipped darkmatter-data")
+    cmd.set_defaults(func=_ingest)
+
+    cmd = commands.add_parser("export", help="write limits to a memory-mappable .npz limit pack")
+    cmd.add_argument("output", help="pack file, .npz")
+    cmd.add_argument("--type", help="SI or SD")
+    cmd.add_argument("--expr", help="experiment name prefix")
+    cmd.set_defaults(func=_export)
+
+    cmd = commands.add_parser("serve", help="answer limit queries and translations over HTTP")
+    cmd.add_argument("--host", default="127.0.0.1")
+    cmd.add_argument("--port", type=int, default=8080)
+    cmd.add_argument("--cache-size", type=int, default=1024, help="responses kept in the LRU cache, 0 to disable")
+    cmd.set_defaults(func=_serve)
+    return main_parser
+
+
+def _errors():
+    # lmdb errors can only be raised once a command has imported lmdb
+    lmdb = sys.modules.get("lmdb")
+    return (KeyError, ValueError, OSError) + ((lmdb.Error,) if lmdb is not None else ())
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except _errors() as err:
+        message = err.args[0] if isinstance(err, KeyError) and err.args else err
+        print(f"lhctodd {args.command}: error: {message}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
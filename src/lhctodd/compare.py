@@ -0,0 +1,144 @@
+"""Compare translated LHC limits with direct detection limits
+
+Every LHC curve, a ``(sigma, chi_mass)`` array as returned by
+``SI(...).from_csv`` or ``rescaled_limit.limit``, is compared with every
+direct detection limit of a ``LimitStack`` in one pass: all of them are
+interpolated on the union of their masses, where their log-log ratio is
+linear between points so that crossings are found exactly, and the ratio
+``sigma_LHC / sigma_DD`` gives the side setting the stronger limit.
+
+    >>> res = lhctodd.compare(lhctodd.SI(g_quark=0.25).from_csv("monojet.csv"), type="SI")
+    >>> res.intervals()   # curve, id, expr, stronger, mass_min, mass_max
+    >>> res.crossings()   # curve, id, expr, mass, stronger_below, stronger_above
+"""
+from .tools import dd_format
+from .stack import LimitStack
+
+import numpy as np
+
+
+def _as_curves(curves, labels):
+    if hasattr(curves, "limit") and hasattr(curves, "__len__"):
+        # rescaled_limit: one curve per coupling point
+        if labels is None:
+            labels = [tuple(point) for point in curves.couplings.tolist()]
+        curves = [curves.limit(i) for i in range(len(curves))]
+    elif isinstance(curves, np.ndarray) and curves.ndim == 2:
+        curves = [curves]
+    if labels is None:
+        labels = list(range(len(curves)))
+    if len(labels) != len(curves):
+        raise ValueError(f"{len(labels)} labels for {len(curves)} curves")
+
+    records = []
+    for curve in curves:
+        curve = np.asarray(curve, dtype=np.float64)
+        if curve.ndim != 2 or curve.shape[1] < 2:
+            raise ValueError(f"curves should be (n, 2) arrays of (sigma, chi_mass), got shape {curve.shape}")
+        curve = curve[np.isfinite(curve[:,:2]).all(axis=1) & (curve[:,:2] > 0).all(axis=1)]
+        if len(curve) < 2:
+            raise ValueError("a curve needs at least two points with positive sigma and mass")
+        records.append(dd_format(curve[:, [1, 0]], {"type": "LHC"}))
+    return records, labels
+
+
+class comparison:
+    """Ratios, crossings and stronger-limit intervals of LHC curves against
+    direct detection limits
+
+    ``mass`` is the common mass grid, ``ratio`` the ``(n_curves, n_limits,
+    n_masses)`` array of ``sigma_LHC / sigma_DD``, NaN where either is not
+    defined, so that the LHC curve is stronger where it is below 1.
+    """
+    def __init__(self, labels, stack, mass, ratio):
+        self.labels = labels
+        self.ids = stack.ids
+        self.expr = stack.expr
+        self.mass = mass
+        self.ratio = ratio
+
+    def _pairs(self, flat):
+        curve, limit = np.divmod(flat, len(self.ids))
+        return {
+            "curve": [self.labels[i] for i in curve.tolist()],
+            "id": self.ids[limit],
+            "expr": self.expr[limit],
+        }
+
+    def _crossing_mass(self, pair, left):
+        # log-log ratio is linear between grid masses
+        x = np.log(self.mass)
+        r0 = np.log(self._flat[pair, left])
+        r1 = np.log(self._flat[pair, left + 1])
+        return np.exp(x[left] + r0 * (x[left + 1] - x[left]) / (r0 - r1))
+
+    @property
+    def _flat(self):
+        return self.ratio.reshape(-1, len(self.mass))
+
+    def _states(self):
+        # -1 where the LHC curve is stronger, 1 where the DD limit is, 0 undefined
+        flat = self._flat
+        return np.where(np.isnan(flat), 0, np.where(flat < 1, -1, 1)).astype(np.int8)
+
+    def crossings(self):
+        """Tidy table of the crossing masses of every (curve, limit) pair
+        """
+        import pandas as pd
+        state = self._states()
+        pair, left = np.nonzero((state[:, :-1] * state[:, 1:]) < 0)
+        table = self._pairs(pair)
+        table["mass"] = self._crossing_mass(pair, left)
+        names = np.array(["LHC", "DD"])
+        table["stronger_below"] = names[(state[pair, left] > 0).astype(int)]
+        table["stronger_above"] = names[(state[pair, left + 1] > 0).astype(int)]
+        return pd.DataFrame(table)
+
+    def intervals(self):
+        """Tidy table of the mass intervals where each side sets the stronger
+        limit, for every (curve, limit) pair where both are defined
+        """
+        import pandas as pd
+        state = self._states()
+        padded = np.pad(state, ((0, 0), (1, 1)))
+        starts = np.nonzero((padded[:, 1:-1] != 0) & (padded[:, 1:-1] != padded[:, :-2]))
+        ends = np.nonzero((padded[:, 1:-1] != 0) & (padded[:, 1:-1] != padded[:, 2:]))
+        pair, first = starts
+        last = ends[1]
+
+        mass_min = self.mass[first].copy()
+        crossed = (first > 0) & (state[pair, np.maximum(first - 1, 0)] == -state[pair, first])
+        mass_min[crossed] = self._crossing_mass(pair[crossed], first[crossed] - 1)
+        mass_max = self.mass[last].copy()
+        n = len(self.mass)
+        crossed = (last < n - 1) & (state[pair, np.minimum(last + 1, n - 1)] == -state[pair, last])
+        mass_max[crossed] = self._crossing_mass(pair[crossed], last[crossed])
+
+        table = self._pairs(pair)
+        table["stronger"] = np.where(state[pair, first] < 0, "LHC", "DD")
+        table["mass_min"] = mass_min
+        table["mass_max"] = mass_max
+        return pd.DataFrame(table)
+
+
+def compare(curves, limits=None, labels=None, mass=None, **query):
+    """Compare LHC curves with direct detection limits
+
+    Parameters
+    ----------
+    curves: ``(n, 2)`` array of ``(sigma, chi_mass)`` rows, list of them, or a ``rescaled_limit``
+    limits: ``LimitStack``, or ids of the direct detection limits, by default those matching ``query``
+    labels: name of each curve in the tables, defaults to their index (couplings for a ``rescaled_limit``)
+    mass: common mass grid, defaults to the union of the masses of all the curves and limits
+    query: metadata selection of the limits (type, expr, year_min, ...)
+
+    Returns a ``comparison``.
+    """
+    records, labels = _as_curves(curves, labels)
+    lhc = LimitStack.from_records(records)
+    stack = limits if isinstance(limits, LimitStack) else LimitStack(limits, **query)
+    if mass is None:
+        mass = np.unique(np.concatenate([lhc.mass, stack.mass]))
+    mass = np.asarray(mass, dtype=np.float64)
+    ratio = lhc.sigma(mass)[:, None, :] / stack.sigma(mass)[None, :, :]
+    return comparison(labels, stack, mass, ratio)
@@ -0,0 +1,172 @@
+"""Dense scans of mediator widths and DM-nucleon cross-sections
+
+The grid spanned by ``(med_mass, chi_mass, g_q, g_chi, g_l)`` is never
+materialised: its flat index range is cut into chunks of ``chunk_size``
+points, each chunk gathers its coordinates, evaluates the widths and the
+cross-section and writes them into the output arrays. Memory use is set by
+the chunk size, and the outputs can be memory-mapped ``.npy`` files, so
+grids of 10^8 points fit on a laptop.
+"""
+from .theory import width
+from .model import SI, SD
+
+import concurrent.futures
+import numpy as np
+import os
+
+
+AXES = ("med_mass", "chi_mass", "g_q", "g_chi", "g_l")
+QUANTITIES = ("width", "ratio", "sigma")
+MODELS = ("vector", "axial", "scalar")
+BACKENDS = ("analytic", "tabulated")
+
+
+def _widths(backend):
+    if backend == "analytic":
+        return width
+    if backend == "tabulated":
+        return width.tabulated()
+    raise ValueError(f"unknown width backend {backend!r}, use one of {BACKENDS}")
+
+
+def _total_width(model, med_mass, chi_mass, g_q, g_chi, g_l, width=width):
+    if model == "vector":
+        return width.vector_total(med_mass, chi_mass, g_q, g_chi, g_l)
+    if model == "axial":
+        return width.axial_total(med_mass, chi_mass, g_q, g_chi, g_l)
+    if model == "scalar":
+        return width.scalar_total(med_mass, chi_mass, g_q, g_chi)
+    raise ValueError(f"unknown model {model!r}, use one of {MODELS}")
+
+
+def _sigma(model, med_mass, chi_mass, g_q, g_chi):
+    translation = SD if model == "axial" else SI
+    return translation(g_chi=g_chi, g_quark=g_q).sigma(med_mass, chi_mass)
+
+
+def _evaluate(model, axes, start, stop, quantities, backend="analytic"):
+    # values of the requested quantities for flat grid indices [start, stop)
+    shape = tuple(len(axis) for axis in axes)
+    index = np.unravel_index(np.arange(start, stop), shape)
+    med_mass, chi_mass, g_q, g_chi, g_l = (axis[i] for axis, i in zip(axes, index))
+    values = {}
+    if "width" in quantities or "ratio" in quantities:
+        total = _total_width(model, med_mass, chi_mass, g_q, g_chi, g_l, _widths(backend))
+        values["width"] = total
+        values["ratio"] = total / med_mass
+    if "sigma" in quantities:
+        values["sigma"] = _sigma(model, med_mass, chi_mass, g_q, g_chi)
+    return start, stop, {name: values[name] for name in quantities}
+
+
+class grid_result:
+    """Labelled N-D result of ``scan``
+
+    ``axes`` maps the axis names to their coordinates, in the order of the
+    array dimensions, and every computed quantity (``width``, ``ratio``,
+    ``sigma``) is an array, or a memory-mapped ``.npy``, of shape ``shape``.
+    """
+    def __init__(self, model, axes, arrays):
+        self.model = model
+        self.axes = dict(zip(AXES, axes))
+        self.shape = tuple(len(axis) for axis in axes)
+        self.quantities = tuple(arrays)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def squeeze(self):
+        """Drop the axes of length one from the quantities
+        """
+        return {name: np.squeeze(self[name]) for name in self.quantities}
+
+    def to_frame(self):
+        """Long-format pandas DataFrame, one row per grid point
+        """
+        import pandas as pd
+        index = pd.MultiIndex.from_product(self.axes.values(), names=self.axes.keys())
+        return pd.DataFrame(
+            {name: np.ravel(self[name]) for name in self.quantities},
+            index=index
+        ).reset_index()
+
+
+def scan(model, med_mass, chi_mass, g_q=0.25, g_chi=1.0, g_l=0.0,
+         quantities=QUANTITIES, chunk_size=1_000_000, processes=None,
+         out=None, dtype=np.float64, backend="analytic"):
+    """Widths and cross-sections on the grid spanned by the axis values
+
+    Parameters
+    ----------
+    model: mediator, "vector" (SI), "axial" (SD) or "scalar" (SI)
+    med_mass, chi_mass, g_q, g_chi, g_l: axis coordinates, scalars are axes of length one
+    quantities: any of "width" (total mediator width), "ratio" (width/med_mass) and "sigma" (DM-nucleon cross-section)
+    chunk_size: number of grid points evaluated at once, bounds the memory used
+    processes: evaluate the chunks on a pool of that many processes, serially if None
+    out: directory where the quantities are written as memory-mapped ``<quantity>.npy``
+    dtype: data type of the stored quantities
+    backend: "analytic" widths, or "tabulated" ones (see ``lhctodd.tabulate``), faster at a relative error below 1e-4
+
+    Examples
+    --------
+    >>> from lhctodd import grid
+    >>> res = grid.scan("vector", np.linspace(100, 3000, 300), np.linspace(1, 1000, 200),
+    ...                 g_q=np.linspace(0.05, 1.0, 20))
+    >>> res.ratio.shape
+    (300, 200, 20, 1, 1)
+    """
+    if model not in MODELS:
+        raise ValueError(f"unknown model {model!r}, use one of {MODELS}")
+    _widths(backend)
+    for name in quantities:
+        if name not in QUANTITIES:
+            raise ValueError(f"unknown quantity {name!r}, use any of {QUANTITIES}")
+    axes = [
+        np.atleast_1d(np.asarray(axis, dtype=np.float64))
+        for axis in (med_mass, chi_mass, g_q, g_chi, g_l)
+    ]
+    shape = tuple(len(axis) for axis in axes)
+    size = int(np.prod(shape))
+
+    arrays = {}
+    for name in quantities:
+        if out is None:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            os.makedirs(out, exist_ok=True)
+            arrays[name] = np.lib.format.open_memmap(
+                os.path.join(out, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape
+            )
+    flat = {name: array.reshape(-1) for name, array in arrays.items()}
+
+    def store(result):
+        start, stop, values = result
+        for name, value in values.items():
+            flat[name][start:stop] = value
+
+    chunks = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    if processes is None:
+        for start, stop in chunks:
+            store(_evaluate(model, axes, start, stop, quantities, backend))
+    else:
+        # keep a bounded number of chunks in flight so that finished results
+        # do not pile up in memory
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            pending = set()
+            for start, stop in chunks:
+                if len(pending) >= 2 * processes:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        store(future.result())
+                pending.add(pool.submit(_evaluate, model, axes, start, stop, quantities, backend))
+            for future in concurrent.futures.as_completed(pending):
+                store(future.result())
+
+    for array in arrays.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+    return grid_result(model, axes, arrays)
@@ -0,0 +1,98 @@
+"""Secondary indexes of the limit database
+
+Each indexed metadata field lives in a named sub-database of
+``darkmatter-data`` that maps the field value to the keys of the records
+carrying it, so that metadata lookups are B-tree seeks instead of a scan
+that decodes every limit.
+"""
+from .tools import __data_path__
+from .tools import dd_format
+
+import sys
+
+
+INDEX_FIELDS = ("type", "expr", "cite", "name", "year")
+ENVELOPE_DB = b"meta:envelope"
+MAX_DBS = 16
+
+
+def index_name(field):
+    return f"index:{field}".encode("ascii")
+
+
+def index_value(value):
+    return str(value).encode("utf-8")
+
+
+def record_key(limit_id):
+    """Key of the record of a limit in the main database
+    """
+    return f"{int(limit_id):08}".encode("ascii")
+
+
+def is_record_key(key):
+    # named sub-databases are stored as keys of the main database too
+    return len(key) == 8 and key.isdigit()
+
+
+def open_indexes(env, txn=None, create=False):
+    """Handles of the index sub-databases, None if the database has no indexes
+    """
+    import lmdb
+    try:
+        return {
+            field: env.open_db(index_name(field), txn=txn, dupsort=True, create=create)
+            for field in INDEX_FIELDS
+        }
+    except (lmdb.NotFoundError, lmdb.ReadonlyError):
+        return None
+
+
+def open_envelopes(env, txn=None, create=False):
+    """Handle of the world-limit envelopes of ``lhctodd.world``, None if the
+    database has none
+    """
+    import lmdb
+    try:
+        return env.open_db(ENVELOPE_DB, txn=txn, create=create)
+    except (lmdb.NotFoundError, lmdb.ReadonlyError):
+        return None
+
+
+def add_record(txn, dbs, key, record):
+    """Register ``record`` stored under ``key`` in every index
+    """
+    for field in INDEX_FIELDS:
+        txn.put(index_value(getattr(record, field)), key, db=dbs[field], dupdata=False)
+
+
+def remove_record(txn, dbs, key, record):
+    """Remove ``record`` stored under ``key`` from every index
+    """
+    for field in INDEX_FIELDS:
+        txn.delete(index_value(getattr(record, field)), key, db=dbs[field])
+
+
+def build_indexes(path=None):
+    """(Re)build all the indexes of an LMDB limit database
+    """
+    import lmdb
+    if path is None:
+        path = __data_path__ / "darkmatter-data"
+    env = lmdb.open(str(path), max_dbs=MAX_DBS)
+    try:
+        with env.begin(write=True) as txn:
+            dbs = open_indexes(env, txn=txn, create=True)
+            for db in dbs.values():
+                txn.drop(db, delete=False)
+            records = [
+                (key, value) for key, value in txn.cursor() if is_record_key(key)
+            ]
+            for key, value in records:
+                add_record(txn, dbs, key, dd_format.from_buffer(value))
+    finally:
+        env.close()
+
+
+if __name__ == "__main__":
+    build_indexes(sys.argv[1] if len(sys.argv) > 1 else None)
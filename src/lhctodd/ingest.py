@@ -0,0 +1,202 @@
+"""Add or update direct detection limits in an LMDB limit database
+
+Limits are read from CSV/text files of ``(mass, sigma)`` rows, with their
+metadata (``type``, ``expr``, ``name``, ``cite``, ``year`` and optionally
+``id``) given either by a manifest::
+
+    [{"file": "xenonnt-si.csv", "type": "SI", "expr": "XENONnT",
+      "name": "XENONnT", "cite": "2303.14729", "year": 2023}]
+
+or by a ``<file>.json`` sidecar next to each file of a directory. Every
+limit is validated, then all of them are written in a single transaction
+together with the index entries and the updated envelopes of
+``lhctodd.world``. A record replaces the existing one with
+the same type, arXiv id and name, and is skipped when its content hash is
+unchanged.
+
+    lhctodd ingest new-limits/ [--db path/to/darkmatter-data]
+"""
+from .tools import __data_path__
+from .tools import dd_format
+from .index import add_record, remove_record, open_indexes, is_record_key, record_key
+from .registry import open_env, release_env
+
+import hashlib
+import json
+import numpy as np
+from pathlib import Path
+
+
+HASH_DB = b"meta:hash"
+FIRST_ID = 1000
+
+
+def validate(limit, label="limit"):
+    """Check a ``(mass, sigma)`` array, raise ValueError when it is unusable
+    """
+    limit = np.asarray(limit, dtype=np.float64)
+    if limit.ndim != 2 or limit.shape[1] != 2 or len(limit) < 2:
+        raise ValueError(f"{label}: expected at least two (mass, sigma) rows, got shape {limit.shape}")
+    if not np.isfinite(limit).all():
+        raise ValueError(f"{label}: contains NaN or infinite values")
+    if (limit <= 0).any():
+        raise ValueError(f"{label}: masses and cross-sections must be positive")
+    if (np.diff(limit[:,0]) <= 0).any():
+        raise ValueError(f"{label}: masses must be strictly increasing")
+    return limit
+
+
+def read_limit(filename):
+    """``(mass, sigma)`` array of a comma or whitespace separated file
+    """
+    with open(filename) as f:
+        lines = [line for line in f if line.strip() and not line.lstrip().startswith("#")]
+    delimiter = "," if lines and "," in lines[0] else None
+    return np.loadtxt(lines, delimiter=delimiter, ndmin=2)[:, :2]
+
+
+def load_source(source):
+    """List of ``(meta, limit)`` pairs from a manifest or a directory of
+    limit files with JSON sidecars
+    """
+    source = Path(source)
+    if source.is_dir():
+        entries = []
+        for filename in sorted(source.iterdir()):
+            if filename.suffix not in (".csv", ".txt", ".dat"):
+                continue
+            sidecar = filename.with_suffix(".json")
+            if not sidecar.exists():
+                raise ValueError(f"{filename}: no metadata file {sidecar.name}")
+            with open(sidecar) as f:
+                entries.append(dict(json.load(f), file=filename.name))
+        base = source
+    else:
+        with open(source) as f:
+            entries = json.load(f)
+        base = source.parent
+    return [
+        ({key: value for key, value in entry.items() if key != "file"}, read_limit(base / entry["file"]))
+        for entry in entries
+    ]
+
+
+def digest(raw):
+    return hashlib.blake2b(bytes(raw), digest_size=16).digest()
+
+
+def _find_existing(txn, dbs, meta):
+    # key of the stored record with the same type, citation and name
+    if dbs is None:
+        return None
+    cursor = txn.cursor(db=dbs["cite"])
+    if not cursor.set_key(str(meta.get("cite", "None")).encode("utf-8")):
+        return None
+    for key in cursor.iternext_dup():
+        stored = dd_format.from_buffer(txn.get(key))
+        if stored.type == meta.get("type", "None") and stored.name == meta.get("name", "None"):
+            return key
+    return None
+
+
+def _mass_range(record):
+    mass = record.get_limit()[:,0]
+    return record.type, mass.min(), mass.max()
+
+
+def _merge(ranges):
+    # overlapping mass ranges of the same type, merged
+    merged = []
+    for limit_type, low, high in sorted(ranges):
+        if merged and merged[-1][0] == limit_type and low <= merged[-1][2]:
+            merged[-1][2] = max(merged[-1][2], high)
+        else:
+            merged.append([limit_type, low, high])
+    return merged
+
+
+def _write(env, records):
+    from .world import update
+    summary = {"added": [], "updated": [], "unchanged": []}
+    changed = [] # (type, mass_min, mass_max) of every written or replaced record
+    with env.begin(write=True) as txn:
+        dbs = open_indexes(env, txn=txn, create=True)
+        hashes = env.open_db(HASH_DB, txn=txn, create=True)
+        keys = [int(key) for key in txn.cursor().iternext(values=False) if is_record_key(key)]
+        next_id = max(keys + [FIRST_ID - 1]) + 1
+        for meta, record in records:
+            raw = record.to_bytes()
+            if "id" in meta:
+                key = record_key(meta['id'])
+            else:
+                key = _find_existing(txn, dbs, meta)
+            if key is None:
+                key = record_key(next_id)
+                next_id += 1
+            limit_id = int(key)
+
+            stored = txn.get(key)
+            if stored is not None:
+                stored_hash = txn.get(key, db=hashes) or digest(stored)
+                if stored_hash == digest(raw):
+                    summary["unchanged"].append(limit_id)
+                    continue
+                old = dd_format.from_buffer(stored)
+                remove_record(txn, dbs, key, old)
+                changed.append(_mass_range(old))
+                summary["updated"].append(limit_id)
+            else:
+                summary["added"].append(limit_id)
+            txn.put(key, raw)
+            txn.put(key, digest(raw), db=hashes)
+            add_record(txn, dbs, key, record)
+            changed.append(_mass_range(record))
+            next_id = max(next_id, limit_id + 1)
+        for limit_type, mass_min, mass_max in _merge(changed):
+            update(env, txn, dbs, limit_type, mass_min, mass_max)
+    return summary
+
+
+def ingest(source, path=None, max_retries=8):
+    """Validate and write limits into the database at ``path``
+
+    Parameters
+    ----------
+    source: manifest, directory of limit files with JSON sidecars, or list of ``(meta, limit)`` pairs
+    path: LMDB environment, created if needed, defaults to the shipped ``darkmatter-data``
+    max_retries: number of times the map size may be doubled when the database is full
+
+    Returns the ids of the added, updated and unchanged limits. Registries
+    reading the same database are reloaded, records read from it before
+    keep a copy of their limit, see ``lhctodd.registry.release_env``.
+    """
+    import lmdb
+    if path is None:
+        path = __data_path__ / "darkmatter-data"
+    entries = load_source(source) if isinstance(source, (str, Path)) else source
+    records = []
+    for meta, limit in entries:
+        label = f"{meta.get('expr', '?')} {meta.get('name', '?')}"
+        records.append((meta, dd_format(validate(limit, label), meta)))
+
+    env = open_env(path, write=True)
+    try:
+        needed = 2 * sum(len(record.to_bytes()) for _, record in records) + (1 << 20)
+        info, stat = env.info(), env.stat()
+        used = (info["last_pgno"] + 1) * stat["psize"]
+        if used + needed > info["map_size"]:
+            env.set_mapsize(max(2 * info["map_size"], used + needed))
+
+        for _ in range(max_retries):
+            try:
+                summary = _write(env, records)
+                break
+            except lmdb.MapFullError:
+                env.set_mapsize(2 * env.info()["map_size"])
+        else:
+            raise lmdb.MapFullError(f"database still full after {max_retries} resizes")
+    finally:
+        # readers open the database read-only again
+        del env
+        release_env(path)
+    return summary
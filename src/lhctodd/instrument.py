@@ -0,0 +1,188 @@
+"""Opt-in counters and timers on the hot paths
+
+When enabled, the package counts and times LMDB environments opened and
+read transactions started, records decoded (with the bytes they span),
+interpolators built and ``theory.width`` kernel calls, by channel and by
+decade of the number of masses. Counters are keyed like
+``width.scalar_qq[n<=1e3]``; totals also count the partial widths they
+call. Disabled, the only cost is a flag check per call.
+
+Enable it for a whole process with ``LHCTODD_STATS=1``, which prints a
+summary on exit (``LHCTODD_STATS=stats.json`` writes it as JSON instead),
+or around a block:
+
+    >>> with lhctodd.instrument.collect(trace="trace.json") as stats:
+    ...     lhctodd.SI().from_csv("scan.csv")
+    >>> print(lhctodd.instrument.report(stats))
+    >>> lhctodd.stats()   # everything counted since the process started
+
+``trace`` writes every timed call as a Chrome trace event file, viewable in
+Perfetto or chrome://tracing. ``profile`` runs a block under cProfile.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+import json
+import os
+import sys
+import threading
+import time
+
+
+enabled = False
+_counters = {} # {name: [calls, seconds, bytes]}
+_trace = None  # list of trace events while tracing
+_lock = threading.Lock()
+
+
+def enable(flag=True):
+    """Turn counting on or off, returns the previous state
+    """
+    global enabled
+    previous, enabled = enabled, bool(flag)
+    return previous
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+def sized(name, n):
+    """Counter name of a call on ``n`` elements, by decade of ``n``
+    """
+    return f"{name}[n<=1e{len(str(n - 1)) if n > 1 else 0}]"
+
+
+def start():
+    """Start time of a measured call, None when counting is disabled
+    """
+    return time.perf_counter() if enabled else None
+
+
+def stop(name, started, nbytes=0):
+    """Count a call of ``name`` started at ``started``, see ``start``
+    """
+    if started is None:
+        return
+    now = time.perf_counter()
+    with _lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = [0, 0.0, 0]
+        counter[0] += 1
+        counter[1] += now - started
+        counter[2] += nbytes
+        if _trace is not None:
+            _trace.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": started * 1e6, "dur": (now - started) * 1e6,
+            })
+
+
+def counted(name, size=None, nbytes=None):
+    """Decorator counting and timing the calls of a function as ``name``
+
+    size: function of the call arguments giving the number of elements processed
+    nbytes: function of the call arguments giving the number of bytes read
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(
+                    sized(name, size(*args, **kwargs)) if size is not None else name,
+                    started, nbytes(*args, **kwargs) if nbytes is not None else 0
+                )
+        return wrapper
+    return decorate
+
+
+def stats():
+    """Snapshot of the counters, ``{name: {"calls", "seconds", "bytes"}}``
+    """
+    with _lock:
+        return {
+            name: {"calls": calls, "seconds": seconds, "bytes": nbytes}
+            for name, (calls, seconds, nbytes) in sorted(_counters.items())
+        }
+
+
+def report(snapshot=None):
+    """Table of a ``stats`` snapshot, the current counters by default
+    """
+    snapshot = stats() if snapshot is None else snapshot
+    lines = [f"{'counter':<40} {'calls':>10} {'total (ms)':>12} {'bytes':>12}"]
+    for name, counter in snapshot.items():
+        lines.append(
+            f"{name:<40} {counter['calls']:>10} {counter['seconds'] * 1e3:>12.3f} {counter['bytes']:>12}"
+        )
+    return "\n".join(lines)
+
+
+@contextmanager
+def collect(trace=None):
+    """Count inside the ``with`` block
+
+    Yields a dict filled on exit with what the block added to the counters,
+    in the format of ``stats``. ``trace`` is a file where the calls of the
+    block are written as Chrome trace events.
+    """
+    global _trace
+    before = stats()
+    previous = enable(True)
+    if trace is not None:
+        _trace = []
+    result = {}
+    try:
+        yield result
+    finally:
+        enable(previous)
+        for name, counter in stats().items():
+            old = before.get(name, {"calls": 0, "seconds": 0.0, "bytes": 0})
+            if counter["calls"] > old["calls"]:
+                result[name] = {key: counter[key] - old[key] for key in counter}
+        if trace is not None:
+            events, _trace = _trace, None
+            with open(trace, "w") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def profile(path=None, sort="cumulative", limit=30):
+    """Run the ``with`` block under cProfile
+
+    The profile is written to ``path``, readable with ``pstats`` or
+    snakeviz, or printed sorted by ``sort`` when no path is given.
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(str(path))
+        else:
+            import pstats
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats(sort).print_stats(limit)
+
+
+def _at_exit(target):
+    if target == "1":
+        print(report(), file=sys.stderr)
+    else:
+        with open(target, "w") as f:
+            json.dump(stats(), f, indent=1)
+
+
+if os.environ.get("LHCTODD_STATS", "0") not in ("", "0"):
+    import atexit
+    enable(True)
+    atexit.register(_at_exit, os.environ["LHCTODD_STATS"])
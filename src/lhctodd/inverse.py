@@ -0,0 +1,130 @@
+"""Direct detection limits translated into the LHC ``(m_med, m_chi)`` plane
+
+Inverting ``sim_model.sigma`` gives the mediator mass at which a model
+reaches the cross-section excluded by a direct detection limit,
+
+    m_med = 1000 * (reference_sigma(m_chi, g_q, g_chi) / sigma_DD(m_chi))**(1/4)
+
+with the reduced mass and normalisation of ``sim_model.reference_sigma``.
+Every combination of couplings and limits is computed at once on a common
+dark matter mass grid, as a ``(n_couplings, n_limits, n_masses)`` array.
+
+    >>> contours = lhctodd.inverse.contours(lhctodd.SI(), [1003, 1006], g_quark=[0.1, 0.25, 1.0])
+    >>> contours.contour(2, 1)     # (m_med, m_chi) rows of XENON1T for g_q = 1
+    >>> contours.to_frame()        # g_quark, g_chi, id, expr, chi_mass, med_mass
+    >>> contours.plot(ax)
+"""
+from .model import DD, sim_model
+from .stack import LimitStack
+from .tools import dd_format
+
+import numpy as np
+
+
+def _stack(limits):
+    if isinstance(limits, LimitStack):
+        return limits
+    if isinstance(limits, DD):
+        limits = [limits]
+    limits = list(limits)
+    if limits and all(isinstance(limit, DD) for limit in limits):
+        # DD objects without an id, like world limits, get negative ones
+        records = {
+            limit.id if limit.id is not None else -1 - i:
+                dd_format(limit.data(), {"type": limit.type, "expr": limit.expr, "name": limit.name})
+            for i, limit in enumerate(limits)
+        }
+        return LimitStack.from_records(records.values(), ids=list(records))
+    return LimitStack(limits)
+
+
+class med_contours:
+    """Mediator masses excluded by direct detection limits for many couplings
+
+    ``med_mass[i, j]`` is the contour of limit ``ids[j]`` for the couplings
+    ``couplings[i] = (g_quark, g_chi)`` at the masses ``chi_mass``, NaN
+    outside the masses covered by the limit. Lighter mediators than the
+    contour give cross-sections above the limit, so they are excluded.
+    """
+    def __init__(self, couplings, stack, chi_mass, med_mass):
+        self.couplings = couplings
+        self.ids = stack.ids
+        self.expr = stack.expr
+        self.name = stack.name
+        self.chi_mass = chi_mass
+        self.med_mass = med_mass
+
+    def contour(self, coupling, limit):
+        """``(m_med, m_chi)`` rows of a contour, in the layout of LHC limit files
+        """
+        med_mass = self.med_mass[coupling, limit]
+        covered = ~np.isnan(med_mass)
+        return np.column_stack([med_mass[covered], self.chi_mass[covered]])
+
+    def to_frame(self):
+        """Tidy table with one row per coupling, limit and dark matter mass
+        """
+        import pandas as pd
+        coupling, limit, mass = np.nonzero(~np.isnan(self.med_mass))
+        return pd.DataFrame({
+            "g_quark": self.couplings[coupling, 0],
+            "g_chi": self.couplings[coupling, 1],
+            "id": self.ids[limit],
+            "expr": self.expr[limit],
+            "chi_mass": self.chi_mass[mass],
+            "med_mass": self.med_mass[coupling, limit, mass],
+        })
+
+    def plot(self, ax=None, **kwargs):
+        """Draw every contour as a single ``LineCollection``, ``m_med`` on the x axis
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        if ax is None:
+            ax = plt.gca()
+        segments, colors = [], []
+        for i, (g_quark, g_chi) in enumerate(self.couplings.tolist()):
+            for j, name in enumerate(self.name):
+                line, = ax.plot([], [], label=f"{name} ($g_q$={g_quark:g}, $g_\\chi$={g_chi:g})")
+                segments.append(self.contour(i, j))
+                colors.append(line.get_color())
+        ax.add_collection(LineCollection(segments, colors=colors, **kwargs))
+        if any(len(segment) for segment in segments):
+            ax.autoscale_view()
+        ax.set_xlabel("$m_{med}$ (GeV)")
+        ax.set_ylabel("$m_{\\chi}$ (GeV)")
+        return ax
+
+
+def contours(model, limits, g_quark=None, g_chi=None, chi_mass=None):
+    """Translate direct detection limits into ``(m_med, m_chi)`` contours
+
+    Parameters
+    ----------
+    model: ``SI`` or ``SD`` instance or class, its couplings are the defaults
+    limits: ``DD``, list of ``DD`` or of limit ids, or a ``LimitStack``
+    g_quark, g_chi: couplings, broadcast together to one contour per pair
+    chi_mass: dark matter masses, defaults to the union of the masses of the limits
+
+    Returns a ``med_contours``.
+    """
+    if isinstance(model, type) and issubclass(model, sim_model):
+        model = model()
+    stack = _stack(limits)
+    g_quark = model.g_quark if g_quark is None else g_quark
+    g_chi = model.g_chi if g_chi is None else g_chi
+    g_quark, g_chi = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(g_quark, dtype=np.float64)),
+        np.atleast_1d(np.asarray(g_chi, dtype=np.float64)),
+    )
+    couplings = np.column_stack([g_quark.ravel(), g_chi.ravel()])
+    if chi_mass is None:
+        chi_mass = np.unique(stack.mass)
+    chi_mass = np.atleast_1d(np.asarray(chi_mass, dtype=np.float64))
+
+    # (n_couplings, 1, n_masses) reference cross-sections against (1, n_limits, n_masses) limits
+    med_mass = model.mediator_mass(
+        stack.sigma(chi_mass)[None, :, :], chi_mass[None, None, :],
+        couplings[:, 0, None, None], couplings[:, 1, None, None]
+    )
+    return med_contours(couplings, stack, chi_mass, med_mass)
@@ -0,0 +1,67 @@
+"""Convert a database of pickled ``dd_format`` objects to the binary layout
+
+Legacy databases stored every limit as a pickle, which runs arbitrary code
+when loaded. This tool is the only place that still reads them, through an
+unpickler restricted to the ``dd_format`` class.
+
+    python -m lhctodd.migrate [path/to/darkmatter-data]
+"""
+from .tools import __data_path__
+from .tools import dd_format
+from .index import MAX_DBS, build_indexes, is_record_key
+
+import io
+import lmdb
+import numpy as np
+import pickle
+import sys
+
+
+class _legacy_unpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == "lhctodd.tools" and name == "dd_format":
+            return dd_format
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a limit record")
+
+
+def is_legacy(raw):
+    return bytes(raw[:len(dd_format.magic)]) != dd_format.magic
+
+
+def from_legacy(raw):
+    """Re-encode a pickled ``dd_format`` record with the binary layout
+    """
+    old = _legacy_unpickler(io.BytesIO(bytes(raw))).load()
+    limit = np.frombuffer(old.limit, dtype=np.float64).reshape(old.size, old.ncol)
+    meta = {field: getattr(old, field, "None") for field in dd_format._meta_fields}
+    return dd_format(limit, meta).to_bytes()
+
+
+def migrate(path=None):
+    """Convert in place every pickled record of the database at ``path``
+
+    Returns the number of converted records. Records already in the binary
+    layout are left untouched and the indexes are rebuilt afterwards.
+    """
+    if path is None:
+        path = __data_path__ / "darkmatter-data"
+    env = lmdb.open(str(path), max_dbs=MAX_DBS)
+    converted = 0
+    try:
+        with env.begin(write=True) as txn:
+            legacy = [
+                (key, value) for key, value in txn.cursor()
+                if is_record_key(key) and is_legacy(value)
+            ]
+            for key, value in legacy:
+                txn.put(key, from_legacy(value))
+                converted += 1
+    finally:
+        env.close()
+    build_indexes(path)
+    return converted
+
+
+if __name__ == "__main__":
+    n = migrate(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"converted {n} records")
@@ -1,101 +1,69 @@
-from .tools import __data_path__
-from .tools import dd_format
-from scipy import interpolate
+from .registry import registry
+from .stream import read_masses, open_writer
 
-import lmdb
-import pickle
-import matplotlib.pyplot as plt
+import numpy as np
 
 
 class DD:
     # Direct Detection measurements
-    def __init__(self, limit_id=None, pattern=None, arxiv=None):
+    # extrapolate: outside the measured masses, "power" extends the end
+    # segments as power laws, "clamp" holds the end values, "nan" gives NaN
+    # pickled as (id, extrapolate), the record and interpolator are taken
+    # back from the registry cache of the receiving process
+    # data() is a read-only view on the database, copied into the record
+    # when the process forks or writes to the database, copy it to keep it
+    # longer than the DD
+    def __init__(self, limit_id=None, pattern=None, arxiv=None, extrapolate="power"):
         self._data = None
-        self._env = lmdb.open(str( __data_path__ / f"darkmatter-data"), readonly=True)
-        with self._env.begin() as txn:
-            if limit_id is not None:
-                data = txn.get(f"{limit_id:08}".encode("ascii"))
-                self._data = pickle.loads(data)
-            else:
-                for key, _ in txn.cursor():
-                    raw = txn.get(key)
-                    data = pickle.loads(raw)
-                    if pattern is not None:
-                        if pattern in data.__dict__.values():
-                            self._data = data
-                            break
-                    if arxiv is not None:
-                        if arxiv in data.cite:
-                            self._data = data
-                            break
-        self._env.close()
+        self.extrapolate = extrapolate
+        if limit_id is None:
+            limit_id = registry.find(pattern=pattern, arxiv=arxiv)
+        if limit_id is not None:
+            self._data = registry.get(limit_id)
 
         assert self._data is not None
-        self._limit = self._data.get_limit()
+        self.id = int(limit_id)
         self.name = self._data.name
         self.type = self._data.type
+        self.expr = self._data.expr
         self.cite = "https://arxiv.org/abs/{}".format(self._data.cite)
-        self._func = interpolate.interp1d(
-            self._limit[:,0],
-            self._limit[:,1],
-            fill_value="extrapolate"
-        )
+        self._func = registry.interpolator(limit_id)
+
+    def __reduce__(self):
+        return (type(self), (self.id, None, None, self.extrapolate))
 
     def sigma(self, mass=100):
-        return self._func(mass)
+        return self._func(mass, self.extrapolate)
 
     def data(self):
         return self._data.get_limit()
 
     def to_pandas(self):
+        import pandas as pd
         return pd.DataFrame(
             self._data.get_limit(),
             columns=["mass", "sigma"]
         )
-    def plot(self, ax=None):
-        if ax is None:
-            ax = plt.gca()
-
-        ax.plot(
-            self._limit[:,0],
-            self._limit[:,1],
-            label= self._data.name
+    def plot(self, ax=None, max_points=None):
+        """Draw the limit, decimated to ``max_points``, see ``lhctodd.plotting``
+        """
+        from .plotting import plot_curves
+        limit = self.data()
+        return plot_curves(
+            [(limit[:,0], limit[:,1], self.name)],
+            ax, self.type, max_points
         )
 
-        ax.set_xlabel("$m_{\chi}$ (GeV)")
-        ax.set_ylabel(
-            "{model} DM-nucleon cross-section (cm$^2$)".format(
-                model=self._data.type
-            )
-        )
-        ax.set_xscale("log")
-        ax.set_yscale("log")
-
-
-def plot_all(limit_type="SI", ax=None):
-    _env = lmdb.open(str( __data_path__ / f"darkmatter-data"), readonly=True)
-    with _env.begin() as txn:
-        for key, _ in txn.cursor():
-            raw = txn.get(key)
-            data = pickle.loads(raw)
-            if limit_type in data.type:
-                limit = data.get_limit()
-                if ax is None:
-                    ax = plt.gca()
-                ax.plot(
-                    limit[:,0],
-                    limit[:,1],
-                    label = data.name
-                )
-                ax.set_xlabel("$m_{\chi}$ (GeV)")
-                ax.set_ylabel(
-                    "{model} DM-nucleon cross-section (cm$^2$)".format(
-                        model=data.type
-                    )
-                )
-                ax.set_xscale("log")
-                ax.set_yscale("log")
-    _env.close()
+
+def plot_all(limit_type="SI", ax=None, max_points=None):
+    """Draw every limit of ``limit_type`` as a single ``LineCollection``
+    """
+    from .plotting import plot_curves
+    curves = [
+        (data.get_limit()[:,0], data.get_limit()[:,1], data.name)
+        for _, data in registry.records() if limit_type in data.type
+    ]
+    return plot_curves(curves, ax, limit_type, max_points)
 
 
 
@@ -111,19 +79,51 @@ class sim_model:
         self.type = ""
         self.label = label
 
+    def __reduce__(self):
+        # only the couplings are shipped, not the masses of from_csv/from_array
+        return (type(self), (self.g_chi, self.g_quark, self.g_lepton, self.label))
+
     def from_csv(self, filename, delimiter=","):
         """
         filename: txt/csv file with mediator and dark matter mass the first and second column
         """
-        print("filename : ", filename, delimiter)
-        my_data = np.genfromtxt(filename, delimiter=delimiter)
-        self.med_mass = my_data[:,0] # mediator
-        self.chi_mass = my_data[:,1] # darkmatter
+        masses = [np.concatenate(column) for column in zip(*read_masses(filename, delimiter=delimiter))]
+        self.med_mass = masses[0] if masses else np.empty(0) # mediator
+        self.chi_mass = masses[1] if masses else np.empty(0) # darkmatter
         return np.vstack([
             self.sigma(self.med_mass, self.chi_mass),
             self.chi_mass
         ]).T
-    
+
+    def stream(self, source, chunk_size=1_000_000, delimiter=",", skiprows=0):
+        """Translate a 2D limit file chunk by chunk
+
+        source: .npy (memory-mapped) or txt/csv file, optionally gzipped, with
+                mediator and dark matter mass as first and second column
+        chunk_size: number of rows translated at once
+
+        yields (sigma, chi_mass) arrays of at most chunk_size rows, the
+        masses are not kept on the instance
+        """
+        for med_mass, chi_mass in read_masses(source, chunk_size, delimiter, skiprows):
+            yield np.vstack([
+                self.sigma(med_mass, chi_mass),
+                chi_mass
+            ]).T
+
+    def translate(self, source, output, chunk_size=1_000_000, delimiter=",", skiprows=0):
+        """Translate a 2D limit file into ``output`` with bounded memory
+
+        output: .npy file, or txt/csv file (gzipped if it ends with .gz),
+                written incrementally with (sigma, chi_mass) rows
+
+        returns the number of translated rows
+        """
+        with open_writer(output, ncol=2, delimiter=delimiter) as writer:
+            for block in self.stream(source, chunk_size, delimiter, skiprows):
+                writer.write(block)
+        return writer.rows
+
     def from_array(self, med_mass, chi_mass, delimiter=","):
         """
         med_mass: array-like mediator mass
@@ -136,27 +136,51 @@ class sim_model:
             self.chi_mass
         ]).T
 
-    def sigma(self, med_mass, chi_mass):
-        raise NotImplementedError("sigma not implemented!")
+    # set by the models, see SI and SD
+    normalisation = None
+
+    def reduced_mass(self, chi_mass):
+        """DM-nucleon reduced mass
+        """
+        return self.neutron_mass * chi_mass / (chi_mass + self.neutron_mass)
 
-    def plot(self, ax=None):
-        if ax is None:
-            ax = plt.gca()
+    def reference_sigma(self, chi_mass, g_quark=None, g_chi=None):
+        """Cross-section for a 1 TeV mediator, ``sigma = reference_sigma * (1000/med_mass)**4``
 
-        ax.plot(
-            self.chi_mass,
-            self.sigma(self.med_mass, self.chi_mass),
-            label= self.label
+        g_quark, g_chi: couplings broadcasting with ``chi_mass``, default to the ones of the model
+        """
+        if self.normalisation is None:
+            raise NotImplementedError("sigma not implemented!")
+        g_quark = self.g_quark if g_quark is None else g_quark
+        g_chi = self.g_chi if g_chi is None else g_chi
+        return (
+            self.normalisation
+            * np.power(np.multiply(g_quark, g_chi)/0.25, 2)
+            * np.power(self.reduced_mass(chi_mass), 2)
         )
 
-        ax.set_xlabel("$m_{\chi}$")
-        ax.set_ylabel(
-            "{model} DM-nucleon cross-section (cm$^2$)".format(
-                model=self.type
-            )
+    def sigma(self, med_mass, chi_mass):
+        return self.reference_sigma(chi_mass) * np.power(1000./med_mass, 4)
+
+    def mediator_mass(self, sigma, chi_mass, g_quark=None, g_chi=None):
+        """Mediator mass translated to ``sigma`` at ``chi_mass``, the inverse of ``sigma``
+        """
+        return 1000. * np.power(self.reference_sigma(chi_mass, g_quark, g_chi) / sigma, 0.25)
+
+    def bands(self, med_mass=None, chi_mass=None, **kwargs):
+        """Monte Carlo quantile bands of the translated limit, see ``lhctodd.uncertainty.bands``
+        """
+        from .uncertainty import bands
+        return bands(self, med_mass, chi_mass, **kwargs)
+
+    def plot(self, ax=None, max_points=None):
+        """Draw the translated limit, decimated to ``max_points``, see ``lhctodd.plotting``
+        """
+        from .plotting import plot_curves
+        return plot_curves(
+            [(self.chi_mass, self.sigma(self.med_mass, self.chi_mass), self.label)],
+            ax, self.type, max_points
         )
-        ax.set_xscale("log")
-        ax.set_yscale("log")
 
 
 class SD(sim_model):
@@ -188,13 +212,8 @@ class SD(sim_model):
         super().__init__(g_chi, g_quark, g_lepton, label)
         self.neutron_mass = 0.939
 
-    def sigma(self, med_mass, chi_mass):
-        rat = self.neutron_mass * chi_mass / (chi_mass + self.neutron_mass)
-        sigma = 2.4e-42
-        sigma *= np.power(self.g_quark*self.g_chi/0.25, 2)
-        sigma *= np.power(1000./med_mass, 4)
-        sigma *= np.power(rat,2)
-        return sigma
+    # cross-section for g_q*g_chi = 0.25, m_med = 1 TeV and a reduced mass of 1 GeV
+    normalisation = 2.4e-42
 
 
 class SI(sim_model):
@@ -227,10 +246,9 @@ class SI(sim_model):
         super().__init__(g_chi, g_quark, g_lepton, label)
         self.neutron_mass = 0.939
 
-    def sigma(self, med_mass, chi_mass):
-        rat = self.neutron_mass * chi_mass / (chi_mass + self.neutron_mass)
-        sigma = 6.9e-41
-        sigma *= np.power(self.g_quark*self.g_chi/0.25, 2)
-        sigma *= np.power(1000./med_mass, 4)
-        sigma *= np.power(rat,2)
-        return sigma
+    # cross-section for g_q*g_chi = 0.25, m_med = 1 TeV and a reduced mass of 1 GeV
+    normalisation = 6.9e-41
+
+
+# models by name, for the command line, batch jobs and the server
+MODELS = {"SI": SI, "SD": SD}
@@ -0,0 +1,176 @@
+"""Columnar export of the limit database
+
+Every selected limit is concatenated into flat ``mass``/``sigma`` arrays,
+with ``offsets[i]:offsets[i+1]`` the points of the i-th limit and one
+metadata value per limit in the ``id``, ``type``, ``expr``, ``name``,
+``cite`` and ``year`` columns. ``id`` and ``year`` are integers, ``year``
+is -1 for limits without one.
+
+``export_pack`` writes these arrays as an uncompressed ``.npz`` "limit
+pack". It is a plain numpy archive, readable with ``np.load``, but
+``load_pack`` maps every member straight from the file, one ``memmap``
+per column, so that jobs running on a shared filesystem read the limits
+without loading the whole pack and without an LMDB environment:
+
+    >>> lhctodd.pack.export_pack("limits.npz", type="SI")
+    >>> pack = lhctodd.pack.load_pack("limits.npz")
+    >>> pack.mass[pack.offsets[0]:pack.offsets[1]]   # view on the file
+    >>> pack.limit(0)            # (n, 2) copy of the first limit
+    >>> pack.to_frame()          # long-format DataFrame
+"""
+from .registry import registry as _registry
+
+import numpy as np
+import struct
+import zipfile
+
+
+META_COLUMNS = ("id", "type", "expr", "name", "cite", "year")
+_text_columns = ("type", "expr", "name", "cite")
+
+
+def _year(year):
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return -1
+
+
+def columns(ids=None, registry=None, **query):
+    """Concatenated columns of the selected limits
+
+    Parameters
+    ----------
+    ids: limit ids, by default every limit matching ``query``
+    registry: limit registry to read from, defaults to the shared one
+    query: metadata selection forwarded to ``registry.query``
+
+    Returns a dictionary of the per-limit metadata arrays, the flat ``mass``
+    and ``sigma`` arrays and the ``offsets`` array.
+    """
+    if registry is None:
+        registry = _registry
+    if ids is None:
+        ids = registry.query(**query)
+    records = [registry.get(limit_id) for limit_id in ids]
+    limits = [record.get_limit() for record in records]
+    size = np.array([len(limit) for limit in limits], dtype=np.int64)
+
+    data = {"id": np.asarray(ids, dtype=np.int64)}
+    for field in _text_columns:
+        data[field] = np.array([str(getattr(record, field)) for record in records], dtype=str)
+    data["year"] = np.array([_year(record.year) for record in records], dtype=np.int64)
+    data["offsets"] = np.concatenate([[0], np.cumsum(size)]).astype(np.int64)
+    if limits:
+        data["mass"] = np.concatenate([limit[:,0] for limit in limits])
+        data["sigma"] = np.concatenate([limit[:,1] for limit in limits])
+    else:
+        data["mass"] = np.empty(0)
+        data["sigma"] = np.empty(0)
+    return data
+
+
+def _frame(data):
+    import pandas as pd
+    size = np.diff(data["offsets"])
+    frame = {field: np.repeat(np.asarray(data[field]), size) for field in META_COLUMNS}
+    frame["mass"] = np.asarray(data["mass"])
+    frame["sigma"] = np.asarray(data["sigma"])
+    return pd.DataFrame(frame)
+
+
+def to_frame(ids=None, registry=None, **query):
+    """Long-format DataFrame of the selected limits, one row per point, with
+    columns ``id, type, expr, name, cite, year, mass, sigma``
+
+    >>> lhctodd.to_frame(type="SD").groupby("expr").sigma.min()
+    """
+    return _frame(columns(ids, registry, **query))
+
+
+def export_pack(path, ids=None, registry=None, **query):
+    """Write the selected limits to an uncompressed ``.npz`` limit pack
+
+    Returns the number of limits written.
+    """
+    data = columns(ids, registry, **query)
+    with open(path, "wb") as f:
+        np.savez(f, **data)
+    return len(data["id"])
+
+
+def _member_offset(f, info):
+    # data of a stored zip member starts after its local file header
+    f.seek(info.header_offset)
+    header = f.read(30)
+    if header[:4] != b"PK\x03\x04":
+        raise ValueError(f"{info.filename}: corrupted local header")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def _map_member(path, f, info):
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{info.filename} is compressed and cannot be memory-mapped")
+    f.seek(_member_offset(f, info))
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    if dtype.hasobject:
+        raise ValueError(f"{info.filename} holds Python objects and cannot be memory-mapped")
+    if not np.prod(shape, dtype=np.int64):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(
+        path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+        order="F" if fortran else "C"
+    )
+
+
+class limit_pack:
+    """Limits of a pack file, every column memory-mapped from the file
+
+    Attributes are the ``id``, ``type``, ``expr``, ``name``, ``cite``,
+    ``year``, ``offsets``, ``mass`` and ``sigma`` arrays.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f, zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                name = info.filename[:-len(".npy")]
+                setattr(self, name, _map_member(self.path, f, info))
+        missing = [field for field in META_COLUMNS + ("offsets", "mass", "sigma") if not hasattr(self, field)]
+        if missing:
+            raise ValueError(f"{self.path} is not a limit pack, missing {missing}")
+        self._rows = {limit_id: row for row, limit_id in enumerate(self.id.tolist())}
+
+    def __len__(self):
+        return len(self.id)
+
+    def row(self, limit_id):
+        """Position of a limit id in the pack, raises KeyError if absent
+        """
+        try:
+            return self._rows[int(limit_id)]
+        except KeyError:
+            raise KeyError(f"no limit with id {limit_id} in {self.path}") from None
+
+    def limit(self, row):
+        """``(n, 2)`` array of ``(mass, sigma)`` points of the limit at ``row``
+
+        The two columns are stored apart, so this is a copy: slice ``mass``
+        and ``sigma`` with ``offsets`` for views on the file.
+        """
+        start, stop = self.offsets[row], self.offsets[row + 1]
+        return np.column_stack([self.mass[start:stop], self.sigma[start:stop]])
+
+    def get_limit(self, limit_id):
+        return self.limit(self.row(limit_id))
+
+    def to_frame(self):
+        return _frame(vars(self))
+
+
+def load_pack(path):
+    return limit_pack(path)
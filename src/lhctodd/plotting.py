@@ -0,0 +1,135 @@
+"""Batched and decimated drawing of limit curves
+
+Limits are drawn on log-log axes, so curves are decimated in
+``(log10(mass), log10(sigma))`` with the Largest-Triangle-Three-Buckets
+algorithm, which keeps the peaks, edges and end points of a curve, down to
+about two points per pixel of the axes width. All the curves of a call are
+then added as a single ``LineCollection`` and the axes are set up once.
+
+    >>> fig, ax = plt.subplots()
+    >>> lhctodd.plot_all("SI", ax=ax)
+    >>> ax.legend()
+"""
+import numpy as np
+
+
+POINTS_PER_PIXEL = 2
+_SMALL_BUCKET = 64 # largest bucket scanned in plain Python
+
+
+def lttb(x, y, n_out):
+    """Indices of ``n_out`` points of the curve ``(x, y)`` chosen by
+    Largest-Triangle-Three-Buckets
+
+    Points are taken in the order given, so the curve does not have to be
+    sorted in ``x``. The first and last points are always kept. Small
+    buckets are scanned in plain Python, where NumPy calls would cost more
+    than the arithmetic, large ones with NumPy.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    # average of the next bucket, the last point for the last bucket
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+    next_low = np.append(edges[1:-1], n - 1)
+    next_high = np.append(edges[2:], n)
+    count = next_high - next_low
+    cx = ((sum_x[next_high] - sum_x[next_low]) / count).tolist()
+    cy = ((sum_y[next_high] - sum_y[next_low]) / count).tolist()
+
+    small = (edges[1:] - edges[:-1]).max() <= _SMALL_BUCKET
+    xs, ys = (x.tolist(), y.tolist()) if small else (x, y)
+    edges = edges.tolist()
+    index = [0]
+    selected = 0
+    for i in range(n_out - 2):
+        low, high = edges[i], edges[i + 1]
+        ax, ay = xs[selected], ys[selected]
+        dx, dy = ax - cx[i], cy[i] - ay
+        # twice the triangle area, up to the sign: dx*(y - ay) + dy*(x - ax)
+        if small:
+            best = -1.0
+            for j in range(low, high):
+                area = abs(dx * (ys[j] - ay) + dy * (xs[j] - ax))
+                if area > best:
+                    best, selected = area, j
+        else:
+            area = np.abs(dx * (y[low:high] - ay) + dy * (x[low:high] - ax))
+            selected = low + int(np.argmax(area))
+        index.append(selected)
+    index.append(n - 1)
+    return np.array(index, dtype=np.int64)
+
+
+def decimate(x, y, max_points):
+    """Curve reduced to at most ``max_points`` points, chosen in log-log space
+
+    Points with a non-positive or non-finite coordinate are dropped.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y) & (x > 0) & (y > 0)
+    x, y = x[keep], y[keep]
+    if max_points is None or len(x) <= max_points:
+        return x, y
+    index = lttb(np.log10(x), np.log10(y), max_points)
+    return x[index], y[index]
+
+
+def budget(ax):
+    """Number of points worth drawing across the width of ``ax``
+    """
+    width = ax.get_window_extent().width
+    return max(int(POINTS_PER_PIXEL * width), 3)
+
+
+def setup_axes(ax, limit_type):
+    ax.set_xlabel("$m_{\\chi}$ (GeV)")
+    ax.set_ylabel(f"{limit_type} DM-nucleon cross-section (cm$^2$)")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+
+
+def plot_curves(curves, ax=None, limit_type="SI", max_points=None, **kwargs):
+    """Draw ``(mass, sigma, label)`` curves as one ``LineCollection``
+
+    Parameters
+    ----------
+    curves: iterable of ``(mass, sigma, label)``
+    ax: matplotlib axes, defaults to the current ones
+    limit_type: cross-section type written on the y axis
+    max_points: points kept per curve, by default two per pixel of the axes
+        width, curves of less than twice as many points being left as they are
+    kwargs: passed on to ``LineCollection``
+
+    Every curve gets the next colour of the axes colour cycle and a legend
+    entry. Returns the ``LineCollection``.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    if ax is None:
+        ax = plt.gca()
+    strict = max_points is not None
+    if not strict:
+        max_points = budget(ax)
+    setup_axes(ax, limit_type)
+
+    segments, colors = [], []
+    for mass, sigma, label in curves:
+        # decimating curves barely above the budget costs more than it saves
+        keep = max_points if strict or np.size(mass) > 2 * max_points else None
+        mass, sigma = decimate(mass, sigma, keep)
+        # empty line carrying the colour and the legend entry
+        line, = ax.plot([], [], label=label)
+        segments.append(np.column_stack([mass, sigma]))
+        colors.append(line.get_color())
+    collection = LineCollection(segments, colors=colors, **kwargs)
+    ax.add_collection(collection)
+    if any(len(segment) for segment in segments):
+        ax.autoscale_view()
+    return collection
@@ -0,0 +1,414 @@
+from .tools import __data_path__
+from .tools import dd_format
+from .index import INDEX_FIELDS, MAX_DBS
+from .index import index_value, is_record_key, open_envelopes, open_indexes, record_key
+from .interp import loglog
+from . import instrument
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import gc
+import os
+import threading
+import weakref
+
+
+# lmdb refuses to open the same environment twice in a process, environments
+# kept alive by records of a previous reload are handed out again
+_environments = weakref.WeakValueDictionary()
+_environments_lock = threading.Lock()
+_registries = weakref.WeakSet()
+# records decoded on the memory map of each environment
+_records = weakref.WeakKeyDictionary()
+
+
+def _detach(env=None):
+    # copy the records decoded on env, or on every environment, out of its
+    # memory map, so that they no longer keep it alive
+    with _environments_lock:
+        if env is None:
+            records = [record for found in _records.values() for record in found]
+            _records.clear()
+        else:
+            records = list(_records.pop(env, ()))
+    for record in records:
+        record.detach()
+
+
+def _before_fork():
+    # children usually exit without ending their transactions, reclaim the
+    # slots of those that are gone
+    for env in list(_environments.values()):
+        env.reader_check()
+
+
+def _after_fork():
+    # the lock may have been held by another thread of the parent
+    global _environments_lock
+    _environments_lock = threading.Lock()
+    # transactions of an inherited environment take reader slots stamped with
+    # the parent's pid, never reclaimed: the child opens its own environments.
+    # Closing an inherited environment unmaps it and ends the transactions
+    # still using it, releasing reader slots the parent still holds, while
+    # freeing a transaction does not end it in the child: copy the records
+    # out of the memory map and let go of the transactions first
+    for registry in list(_registries):
+        registry._reset()
+    _detach()
+    gc.collect()
+    environments = list(_environments.values())
+    _environments.clear()
+    for env in environments:
+        env.close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork)
+
+
+def open_env(path, write=False):
+    """Environment of the database at ``path``, shared in the process
+
+    Databases are opened read-only, so that reading never takes the writer
+    lock and works on read-only file systems. ``write`` opens the database
+    writable, creating it if needed, and is only used to change it: lmdb
+    does not allow the same files to be opened twice in a process, so the
+    read-only environment of the database is released first, see
+    ``release_env``.
+
+    A forked child closes the environments inherited from its parent and
+    opens its own, records read through a registry before the fork are
+    copied first.
+    """
+    import lmdb
+    key = str(Path(path).resolve())
+    env = _environments.get(key)
+    if env is not None and write and env.flags()["readonly"]:
+        release_env(path)
+        env = None
+        if key in _environments:
+            raise lmdb.ReadonlyError(
+                f"{key}: still read in this process, end the transactions reading it"
+            )
+    with _environments_lock:
+        env = _environments.get(key)
+        if env is None:
+            started = instrument.start()
+            if write:
+                env = lmdb.open(key, max_dbs=MAX_DBS)
+            else:
+                env = lmdb.open(key, max_dbs=MAX_DBS, readonly=True, create=False)
+            instrument.stop("lmdb.open", started)
+            _environments[key] = env
+        return env
+
+
+def release_env(path):
+    """Let go of the environment of the database at ``path``
+
+    Registries reading it are reloaded and the records decoded on it are
+    copied out of its memory map. The environment is never closed
+    explicitly, that would end the transactions still using it: it is freed
+    with the last of them, and opened read-only again on next use.
+    """
+    key = str(Path(path).resolve())
+    env = _environments.get(key)
+    if env is None:
+        return
+    for registry in list(_registries):
+        if registry._env is env:
+            registry.reload()
+    _detach(env)
+    del env
+    gc.collect()
+
+
+class limit_registry:
+    """Process-wide, read-only access to the limit database
+
+    The LMDB environment is opened once, on first use, and shared by every
+    caller. Decoded ``dd_format`` records and their interpolators are kept
+    in a bounded LRU cache so that building many ``DD`` objects for the same
+    limits only pays the decoding cost once.
+
+    Records are read through a long-lived read transaction opened with
+    ``buffers=True``: their limit arrays are read-only views on the memory
+    map, valid for as long as the record is alive. Writes made to the
+    database after that transaction started are only seen after ``reload()``.
+
+    The registry is safe to share between threads: index lookups borrow a
+    transaction from a pool of at most ``readers`` read transactions, so
+    that concurrent requests neither open new transactions on every call
+    nor exhaust the reader table of the environment.
+
+    A forked child starts over with its own environment and an empty cache,
+    records decoded before the fork keep a copy of their limit. The parent
+    keeps its transactions and records as they are.
+
+    Parameters
+    ----------
+    path: location of the LMDB environment, defaults to the shipped ``darkmatter-data``
+    maxsize: maximum number of decoded limits kept in memory
+    readers: maximum number of pooled read transactions in use at once
+    """
+    def __init__(self, path=None, maxsize=128, readers=32):
+        self.path = Path(path) if path is not None else __data_path__ / "darkmatter-data"
+        self.maxsize = maxsize
+        self.readers = readers
+        self._reset()
+        _registries.add(self)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._env = None
+        self._indexes = None
+        self._envelopes = None
+        self._txn = None
+        self._pool = []
+        self._generation = 0
+        self._slots = threading.BoundedSemaphore(self.readers)
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _check_fork(self):
+        # transactions, cached records and locks of the parent are not ours
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def env(self):
+        self._check_fork()
+        with self._lock:
+            if self._env is None:
+                self._env = open_env(self.path)
+                # py-lmdb drops handles opened in a read transaction of ours
+                # when it ends, it opens them in a read transaction of its own
+                # on read-only environments
+                self._indexes = open_indexes(self._env)
+                self._envelopes = open_envelopes(self._env)
+            return self._env
+
+    @property
+    def indexes(self):
+        """Handles of the index sub-databases, None for unindexed databases
+        """
+        with self._lock:
+            self.env
+            return self._indexes
+
+    @property
+    def envelopes(self):
+        """Handle of the stored world-limit envelopes, None when there are none
+        """
+        with self._lock:
+            self.env
+            return self._envelopes
+
+    @contextmanager
+    def reader(self):
+        """Read transaction borrowed from the pool, for the duration of the
+        ``with`` block
+
+        Blocks while ``readers`` transactions are already in use. Values
+        read through it are memoryviews, only valid inside the block unless
+        the transaction is kept as ``owner`` of what is built from them::
+
+            with registry.reader() as txn:
+                record = dd_format.from_buffer(txn.get(record_key(1006)), owner=txn)
+
+        Unlike those of ``get``, such records are not copied when the
+        process forks or writes to the database.
+        """
+        self._check_fork()
+        with self._slots:
+            with self._lock:
+                generation = self._generation
+                txn = self._pool.pop() if self._pool else None
+            if txn is None:
+                started = instrument.start()
+                txn = self.env.begin(buffers=True)
+                instrument.stop("lmdb.begin", started)
+            try:
+                yield txn
+            finally:
+                with self._lock:
+                    if generation == self._generation and self._pid == os.getpid():
+                        self._pool.append(txn)
+
+    def keys(self):
+        """List the ids of all the limits stored in the database
+        """
+        with self.reader() as txn:
+            return [
+                int(bytes(key)) for key in txn.cursor().iternext(values=False)
+                if is_record_key(bytes(key))
+            ]
+
+    def _entry(self, limit_id):
+        limit_id = int(limit_id)
+        self._check_fork()
+        with self._lock:
+            entry = self._cache.get(limit_id)
+            if entry is not None:
+                self._cache.move_to_end(limit_id)
+                return entry
+            if self._txn is None:
+                started = instrument.start()
+                self._txn = self.env.begin(buffers=True)
+                instrument.stop("lmdb.begin", started)
+            raw = self._txn.get(record_key(limit_id))
+            if raw is None:
+                raise KeyError(f"no limit with id {limit_id}")
+            record = dd_format.from_buffer(raw, owner=self._txn)
+            with _environments_lock:
+                _records.setdefault(self._env, weakref.WeakSet()).add(record)
+            entry = {"record": record, "func": None}
+            self._cache[limit_id] = entry
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            return entry
+
+    def get(self, limit_id):
+        """Decoded ``dd_format`` record of a limit
+        """
+        return self._entry(limit_id)["record"]
+
+    def interpolator(self, limit_id):
+        """Log-log cross-section interpolator of a limit, built once and cached
+        """
+        entry = self._entry(limit_id)
+        with self._lock:
+            if entry["func"] is None:
+                limit = entry["record"].get_limit()
+                entry["func"] = loglog(limit[:,0], limit[:,1])
+            return entry["func"]
+
+    def records(self):
+        """Iterate over ``(id, dd_format)`` pairs in key order
+        """
+        for limit_id in self.keys():
+            yield limit_id, self.get(limit_id)
+
+    def lookup(self, field, value, prefix=False):
+        """Ids of the limits whose ``field`` equals ``value``, or starts with
+        it when ``prefix`` is set, read from the index without decoding
+        any record
+        """
+        if field not in INDEX_FIELDS:
+            raise ValueError(f"{field} is not an indexed field, use one of {INDEX_FIELDS}")
+        value = index_value(value)
+        dbs = self.indexes
+        ids = set()
+        if dbs is None:
+            for limit_id, data in self.records():
+                stored = index_value(getattr(data, field))
+                if stored == value or (prefix and stored.startswith(value)):
+                    ids.add(limit_id)
+            return sorted(ids)
+        with self.reader() as txn:
+            cursor = txn.cursor(db=dbs[field])
+            if prefix:
+                found = cursor.set_range(value)
+                while found and bytes(cursor.key()).startswith(value):
+                    ids.add(int(bytes(cursor.value())))
+                    found = cursor.next()
+            elif cursor.set_key(value):
+                ids.update(int(bytes(key)) for key in cursor.iternext_dup())
+        return sorted(ids)
+
+    def index_keys(self, field):
+        """Distinct values of an indexed field
+        """
+        dbs = self.indexes
+        if dbs is None:
+            return sorted({index_value(getattr(data, field)) for _, data in self.records()})
+        with self.reader() as txn:
+            return [bytes(key) for key in txn.cursor(db=dbs[field]).iternext_nodup(values=False)]
+
+    def query(self, type=None, expr=None, cite=None, name=None,
+              year=None, year_min=None, year_max=None):
+        """Ids of the limits matching all the given criteria
+
+        ``type`` and ``year`` must match exactly, ``expr``, ``cite`` and
+        ``name`` match by prefix and ``year_min``/``year_max`` bound the
+        publication year (inclusive).
+        """
+        selections = []
+        if type is not None:
+            selections.append(self.lookup("type", type))
+        if year is not None:
+            selections.append(self.lookup("year", year))
+        for field, value in (("expr", expr), ("cite", cite), ("name", name)):
+            if value is not None:
+                selections.append(self.lookup(field, value, prefix=True))
+        if year_min is not None or year_max is not None:
+            ids = set()
+            for key in self.index_keys("year"):
+                try:
+                    key_year = int(key.decode())
+                except ValueError:
+                    continue
+                if year_min is not None and key_year < year_min:
+                    continue
+                if year_max is not None and key_year > year_max:
+                    continue
+                ids.update(self.lookup("year", key_year))
+            selections.append(ids)
+        if not selections:
+            return self.keys()
+        return sorted(set.intersection(*[set(ids) for ids in selections]))
+
+    def search(self, pattern):
+        """Ids of the limits with any indexed metadata equal to ``pattern``
+        """
+        ids = set()
+        for field in INDEX_FIELDS:
+            ids.update(self.lookup(field, pattern))
+        return sorted(ids)
+
+    def find(self, pattern=None, arxiv=None):
+        """Id of the first limit whose metadata matches ``pattern`` or whose
+        citation contains ``arxiv``, None if nothing matches
+        """
+        ids = []
+        if pattern is not None:
+            ids += self.search(pattern)
+        if arxiv is not None:
+            for key in self.index_keys("cite"):
+                if index_value(arxiv) in key:
+                    ids += self.lookup("cite", key.decode("utf-8"))
+        return min(ids) if ids else None
+
+    def invalidate(self, limit_id=None):
+        """Drop one limit, or all of them, from the decoded cache
+        """
+        with self._lock:
+            if limit_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(int(limit_id), None)
+
+    def reload(self, path=None):
+        """Clear the cache and start a new read transaction on next use, so
+        that later writes become visible, optionally switching to another
+        database.
+
+        Environments are never closed explicitly: records decoded before the
+        reload still hold their read transaction, and the environment is
+        freed together with the last of them, see ``release_env``.
+        """
+        self._check_fork()
+        with self._lock:
+            self._cache.clear()
+            self._txn = None
+            self._pool = []
+            self._generation += 1
+            self._env = None
+            self._indexes = None
+            self._envelopes = None
+            if path is not None:
+                self.path = Path(path)
+
+
+registry = limit_registry()
@@ -0,0 +1,168 @@
+"""Project an LHC limit to other couplings and translate it for each of them
+
+The yield of an s-channel mediator produced on-shell and decaying to dark
+matter scales, in the narrow width approximation, as
+
+    g_q**2 * g_chi**2 / width_total(med_mass, chi_mass, g_q, g_chi, g_l)
+
+and as ``(g_q * g_chi)**2`` off-shell (``med_mass < 2 chi_mass``). A limit
+given as an upper limit on the signal strength ``mu`` over a
+``(med_mass, chi_mass)`` grid, obtained at ``reference`` couplings, is
+rescaled to a batch of coupling points by the ratio of their yields, the
+widths of every point being evaluated in a single broadcast pass. The
+``mu = 1`` boundary of each scenario is then translated into a
+DM-nucleon cross-section limit with ``SI`` or ``SD``.
+
+An exclusion contour alone carries no signal strength and cannot be
+rescaled: the ``mu`` grid published with the limit is needed.
+
+    >>> from lhctodd import rescale
+    >>> res = rescale.translate("vector", med_mass, chi_mass, mu,
+    ...                         g_q=np.linspace(0.05, 0.5, 200), g_chi=1.0)
+    >>> res.limit(10)  # (sigma, chi_mass) rows of the 11th scenario
+"""
+from .grid import MODELS, _total_width
+from .model import SI, SD
+
+import numpy as np
+
+
+REFERENCE = (0.25, 1.0, 0.0)
+
+
+def couplings(g_q, g_chi, g_l=0.0):
+    """``(n, 3)`` array of coupling points, the three values broadcast together
+    """
+    points = np.broadcast_arrays(*[np.atleast_1d(np.asarray(g, dtype=np.float64)) for g in (g_q, g_chi, g_l)])
+    if points[0].ndim != 1:
+        raise ValueError("couplings should be scalars or one-dimensional arrays")
+    return np.column_stack(points)
+
+
+def _signal(model, med_mass, chi_mass, g_q, g_chi, g_l):
+    total = _total_width(model, med_mass, chi_mass, g_q, g_chi, g_l)
+    product = np.square(g_q * g_chi)
+    return np.where(med_mass >= 2 * chi_mass, product / total, product)
+
+
+def yield_ratio(model, med_mass, chi_mass, g_q, g_chi, g_l=0.0, reference=REFERENCE):
+    """Signal yield at each coupling point relative to the reference couplings
+
+    Parameters
+    ----------
+    model: mediator, "vector", "axial" or "scalar"
+    med_mass, chi_mass: masses of the points, arrays of the same shape
+    g_q, g_chi, g_l: coupling points, scalars or one-dimensional arrays broadcast together
+    reference: ``(g_q, g_chi, g_l)`` at which the limit was obtained
+
+    Returns an array of shape ``(n_couplings,) + med_mass.shape``.
+    """
+    if model not in MODELS:
+        raise ValueError(f"unknown model {model!r}, use one of {MODELS}")
+    med_mass, chi_mass = np.broadcast_arrays(
+        np.asarray(med_mass, dtype=np.float64), np.asarray(chi_mass, dtype=np.float64)
+    )
+    shape = med_mass.shape
+    med_mass, chi_mass = med_mass.reshape(1, -1), chi_mass.reshape(1, -1)
+    points = couplings(g_q, g_chi, g_l)[:, :, None]
+    signal = _signal(model, med_mass, chi_mass, points[:,0], points[:,1], points[:,2])
+    signal /= _signal(model, med_mass, chi_mass, *reference)
+    return signal.reshape((len(points),) + shape)
+
+
+def rescale(model, med_mass, chi_mass, mu, g_q, g_chi, g_l=0.0, reference=REFERENCE):
+    """Signal strength limits ``mu`` at each coupling point, shape ``(n_couplings,) + mu.shape``
+    """
+    return np.asarray(mu, dtype=np.float64) / yield_ratio(model, med_mass, chi_mass, g_q, g_chi, g_l, reference)
+
+
+class rescaled_limit:
+    """DM-nucleon cross-section limits of every coupling scenario
+
+    ``couplings`` holds the ``(g_q, g_chi, g_l)`` points, ``med_mass`` the
+    largest excluded mediator mass at each ``chi_mass`` (NaN where nothing
+    is excluded) and ``sigma`` the corresponding cross-section, both of
+    shape ``(n_couplings, n_chi)``.
+    """
+    def __init__(self, model, couplings, chi_mass, med_mass, sigma):
+        self.model = model
+        self.type = "SD" if model == "axial" else "SI"
+        self.couplings = couplings
+        self.chi_mass = chi_mass
+        self.med_mass = med_mass
+        self.sigma = sigma
+
+    def __len__(self):
+        return len(self.couplings)
+
+    def limit(self, index):
+        """``(sigma, chi_mass)`` rows of one scenario, as ``sim_model.from_array``
+        """
+        inside = ~np.isnan(self.sigma[index])
+        return np.vstack([self.sigma[index][inside], self.chi_mass[inside]]).T
+
+
+def _boundary(med_mass, mu):
+    # largest mediator mass with mu <= 1 along axis 1 of (n_couplings, n_med, n_chi),
+    # log-log interpolated to mu = 1 with the next grid point
+    n_med = mu.shape[1]
+    excluded = mu <= 1
+    last = n_med - 1 - np.argmax(excluded[:, ::-1, :], axis=1)
+    found = excluded.any(axis=1)
+    upper = np.minimum(last + 1, n_med - 1)
+
+    log_mass = np.log(med_mass)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_mu = np.log(mu)
+        below = np.take_along_axis(log_mu, last[:, None, :], axis=1)[:, 0]
+        above = np.take_along_axis(log_mu, upper[:, None, :], axis=1)[:, 0]
+        t = np.clip(np.where(upper > last, -below / (above - below), 0.0), 0.0, 1.0)
+    boundary = np.exp(log_mass[last] + np.nan_to_num(t) * (log_mass[upper] - log_mass[last]))
+    return np.where(found, boundary, np.nan)
+
+
+def translate(model, med_mass, chi_mass, mu, g_q, g_chi, g_l=0.0, reference=REFERENCE):
+    """Cross-section limits of an LHC signal strength grid at many couplings
+
+    Parameters
+    ----------
+    model: mediator, "vector" (SI), "axial" (SD) or "scalar" (SI)
+    med_mass: ``(n_med,)`` increasing mediator masses of the grid
+    chi_mass: ``(n_chi,)`` dark matter masses of the grid
+    mu: ``(n_med, n_chi)`` upper limits on the signal strength at the reference couplings
+    g_q, g_chi, g_l: coupling points, scalars or one-dimensional arrays broadcast together
+    reference: ``(g_q, g_chi, g_l)`` at which ``mu`` was obtained
+
+    Returns a ``rescaled_limit``.
+    """
+    med_mass = np.asarray(med_mass, dtype=np.float64)
+    chi_mass = np.asarray(chi_mass, dtype=np.float64)
+    mu = np.asarray(mu, dtype=np.float64)
+    if mu.shape != (len(med_mass), len(chi_mass)):
+        raise ValueError(f"mu should have shape {(len(med_mass), len(chi_mass))}, not {mu.shape}")
+    mesh = np.meshgrid(med_mass, chi_mass, indexing="ij")
+    points = couplings(g_q, g_chi, g_l)
+    boundary = _boundary(med_mass, rescale(model, *mesh, mu, *points.T, reference))
+
+    shape = boundary.shape
+    translation = SD if model == "axial" else SI
+    sigma = translation(
+        g_chi=np.broadcast_to(points[:, 1:2], shape),
+        g_quark=np.broadcast_to(points[:, 0:1], shape),
+        g_lepton=np.broadcast_to(points[:, 2:3], shape),
+    ).sigma(boundary, np.broadcast_to(chi_mass, shape))
+    return rescaled_limit(model, points, chi_mass, boundary, sigma)
+
+
+def from_points(rows):
+    """``(med_mass, chi_mass, mu)`` axes and grid of a full rectangular grid
+    given as rows of three columns
+    """
+    rows = np.asarray(rows, dtype=np.float64)
+    med_mass, i = np.unique(rows[:,0], return_inverse=True)
+    chi_mass, j = np.unique(rows[:,1], return_inverse=True)
+    mu = np.full((len(med_mass), len(chi_mass)), np.nan)
+    mu[i, j] = rows[:,2]
+    if np.isnan(mu).any():
+        raise ValueError("the points do not cover a full (med_mass, chi_mass) grid")
+    return med_mass, chi_mass, mu
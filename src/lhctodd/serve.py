@@ -0,0 +1,292 @@
+"""Local HTTP service for limit queries and LHC limit translations
+
+A small asyncio HTTP/1.1 server, standard library only, for tools that need
+limit values without a Python stack::
+
+    lhctodd serve --port 8080
+
+    GET  /limits?type=SI&expr=XENON         metadata of the matching limits
+    GET  /limits/1006                       metadata and points of a limit
+    GET  /sigma?id=1006&mass=10,100,1000    cross-section of a limit
+    POST /sigma      {"id": 1006, "mass": [...], "extrapolate": "power"}
+    POST /translate  {"model": "SD", "g_quark": 0.25, "med_mass": [...], "chi_mass": [...]}
+    GET  /stats                             request, batch and cache counters
+
+Requests evaluating the same limit, or the same model and couplings, that
+arrive together are coalesced into one vectorized evaluation, run off the
+event loop. Successful responses are kept in an LRU cache keyed by the
+request line and body.
+"""
+from .tools import json_number, record_metadata
+from .model import MODELS
+from .registry import registry as _registry
+
+import asyncio
+import json
+import numpy as np
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+
+_reasons = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class coalescer:
+    """Merge concurrent evaluations sharing a key into a single call
+
+    ``evaluate(key, *arrays)`` receives the concatenated arrays of every
+    request queued for ``key`` before the batch starts, and its result is
+    split back into one array per request.
+    """
+    def __init__(self, evaluate):
+        self._evaluate = evaluate
+        self._pending = {}
+        self._tasks = set() # the loop only keeps weak references to tasks
+        self.requests = 0
+        self.batches = 0
+
+    async def __call__(self, key, *arrays):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            loop.call_soon(self._start, loop, key)
+        batch.append((arrays, future))
+        self.requests += 1
+        return await future
+
+    def _start(self, loop, key):
+        task = loop.create_task(self._flush(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key):
+        batch = self._pending.pop(key)
+        self.batches += 1
+        columns = [np.concatenate(column) for column in zip(*[arrays for arrays, _ in batch])]
+        bounds = np.cumsum([len(arrays[0]) for arrays, _ in batch])[:-1]
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, self._evaluate, key, *columns
+            )
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        for part, (_, future) in zip(np.split(result, bounds), batch):
+            if not future.done():
+                future.set_result(part)
+
+
+def _floats(values, name):
+    if values is None:
+        raise HTTPError(400, f"missing {name}")
+    if isinstance(values, str):
+        values = values.split(",")
+    try:
+        return np.atleast_1d(np.asarray(values, dtype=np.float64))
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} should be a list of numbers") from None
+
+
+def _finite(array):
+    return [json_number(value) for value in np.asarray(array).tolist()]
+
+
+class limit_server:
+    """Routes, coalescing and response cache of ``lhctodd serve``
+
+    Parameters
+    ----------
+    registry: limit registry to read from, defaults to the shared one
+    cache_size: maximum number of responses kept in the LRU cache, 0 to disable
+    """
+    def __init__(self, registry=None, cache_size=1024):
+        self.registry = registry if registry is not None else _registry
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._sigma = coalescer(self._evaluate_sigma)
+        self._translate = coalescer(self._evaluate_translation)
+
+    def _evaluate_sigma(self, key, mass):
+        limit_id, extrapolate = key
+        return np.atleast_1d(self.registry.interpolator(limit_id)(mass, extrapolate))
+
+    def _evaluate_translation(self, key, med_mass, chi_mass):
+        model, g_chi, g_quark, g_lepton = key
+        model = MODELS[model](g_chi=g_chi, g_quark=g_quark, g_lepton=g_lepton)
+        return model.sigma(med_mass, chi_mass)
+
+    async def limits(self, query, body):
+        selection = {field: query[field][-1] for field in ("type", "expr", "cite", "name") if field in query}
+        for field in ("year_min", "year_max"):
+            if field in query:
+                selection[field] = int(query[field][-1])
+        ids = self.registry.query(**selection)
+        return [record_metadata(limit_id, self.registry.get(limit_id)) for limit_id in ids]
+
+    async def limit(self, limit_id):
+        record = self.registry.get(limit_id)
+        limit = record.get_limit()
+        output = record_metadata(limit_id, record)
+        output.update(mass=limit[:,0].tolist(), sigma=limit[:,1].tolist())
+        return output
+
+    async def sigma(self, query, body):
+        if body:
+            request = json.loads(body)
+        else:
+            request = {key: values[-1] for key, values in query.items()}
+        if "id" not in request:
+            raise HTTPError(400, "missing id")
+        limit_id = int(request["id"])
+        extrapolate = request.get("extrapolate", "power")
+        if extrapolate not in ("power", "clamp", "nan"):
+            raise HTTPError(400, f"unknown extrapolation {extrapolate!r}")
+        self.registry.get(limit_id)  # unknown ids fail before being batched
+        mass = _floats(request.get("mass"), "mass")
+        sigma = await self._sigma((limit_id, extrapolate), mass)
+        return {"id": limit_id, "mass": _finite(mass), "sigma": _finite(sigma)}
+
+    async def translate(self, query, body):
+        request = json.loads(body or "{}")
+        model = request.get("model", "SI")
+        if model not in MODELS:
+            raise HTTPError(400, f"unknown model {model!r}, use one of {tuple(MODELS)}")
+        key = (
+            model, float(request.get("g_chi", 1.0)),
+            float(request.get("g_quark", 0.25)), float(request.get("g_lepton", 0.0))
+        )
+        med_mass = _floats(request.get("med_mass"), "med_mass")
+        chi_mass = _floats(request.get("chi_mass"), "chi_mass")
+        if med_mass.shape != chi_mass.shape:
+            raise HTTPError(400, "med_mass and chi_mass should have the same length")
+        sigma = await self._translate(key, med_mass, chi_mass)
+        return {"sigma": _finite(sigma), "chi_mass": _finite(chi_mass)}
+
+    async def stats(self, query, body):
+        return {
+            "requests": self._sigma.requests + self._translate.requests,
+            "batches": self._sigma.batches + self._translate.batches,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        if len(parts) == 2 and parts[0] == "limits":
+            if method != "GET":
+                raise HTTPError(405, f"{method} not allowed on /limits")
+            try:
+                return await self.limit(int(parts[1]))
+            except ValueError:
+                raise HTTPError(404, f"no limit {parts[1]!r}") from None
+        routes = {
+            "limits": (self.limits, ("GET",)),
+            "sigma": (self.sigma, ("GET", "POST")),
+            "translate": (self.translate, ("POST",)),
+            "stats": (self.stats, ("GET",)),
+        }
+        if len(parts) != 1 or parts[0] not in routes:
+            raise HTTPError(404, f"no route {url.path}")
+        handler, methods = routes[parts[0]]
+        if method not in methods:
+            raise HTTPError(405, f"{method} not allowed on {url.path}")
+        return await handler(query, body)
+
+    async def respond(self, method, target, body=b""):
+        """Status and encoded JSON body of a request
+        """
+        key = (method, target, body)
+        cached = self._cache.get(key) if self.cache_size and not target.startswith("/stats") else None
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return 200, cached
+        self.cache_misses += 1
+        try:
+            status, payload = 200, await self._route(method, target, body)
+        except HTTPError as err:
+            status, payload = err.status, {"error": str(err)}
+        except KeyError as err:
+            status, payload = 404, {"error": err.args[0] if err.args else "not found"}
+        except (ValueError, TypeError) as err:
+            status, payload = 400, {"error": str(err)}
+        except Exception as err:
+            status, payload = 500, {"error": f"{type(err).__name__}: {err}"}
+        data = json.dumps(payload).encode("utf-8")
+        if status == 200 and self.cache_size and not target.startswith("/stats"):
+            self._cache[key] = data
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return status, data
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = line.decode("latin1").split()
+                    body = await reader.readexactly(int(headers.get("content-length", 0)))
+                except ValueError:
+                    status, data, keep_alive = 400, b'{"error": "malformed request"}', False
+                else:
+                    try:
+                        status, data = await self.respond(method, target, body)
+                    except Exception as err:
+                        status, data = 500, json.dumps({"error": f"{type(err).__name__}: {err}"}).encode("utf-8")
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_reasons[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Listening ``asyncio.Server``, port 0 picks a free port
+        """
+        return await asyncio.start_server(self._connection, host, port)
+
+    def serve(self, host="127.0.0.1", port=8080):
+        async def run():
+            server = await self.start(host, port)
+            for sock in server.sockets:
+                print(f"lhctodd serving on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}")
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
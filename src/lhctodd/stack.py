@@ -0,0 +1,144 @@
+from .registry import registry as _registry
+
+import numpy as np
+
+
+class LimitStack:
+    """Many direct detection limits packed for batched evaluation
+
+    All the selected limits are sorted in mass and concatenated into flat
+    ``mass``/``sigma_values`` arrays, with ``offsets[i]:offsets[i+1]`` the points of
+    the i-th limit. Evaluating the whole stack on a mass array is a single
+    ``searchsorted`` over that ragged layout instead of one interpolator
+    call per limit.
+
+    Parameters
+    ----------
+    ids: limit ids to load, by default every limit matching ``query``
+    registry: limit registry to read from, defaults to the shared one
+    query: metadata selection forwarded to ``registry.query`` (type, expr, year_min, ...)
+
+    Records already in memory are stacked with ``from_records``.
+
+    Examples
+    --------
+    >>> stack = lhctodd.LimitStack(type="SI")
+    >>> sigma = stack.sigma(np.logspace(0, 3, 100))  # (n_limits, n_masses)
+    >>> best, winner = stack.envelope(np.logspace(0, 3, 100))
+    """
+    def __init__(self, ids=None, registry=None, **query):
+        if registry is None:
+            registry = _registry
+        if ids is None:
+            ids = registry.query(**query)
+        self._pack(ids, [registry.get(limit_id) for limit_id in ids])
+
+    @classmethod
+    def from_records(cls, records, ids=None):
+        """Stack of ``dd_format`` records, with ids ``ids``, by default their
+        position in ``records``
+        """
+        records = list(records)
+        stack = cls.__new__(cls)
+        stack._pack(range(len(records)) if ids is None else ids, records)
+        return stack
+
+    def _pack(self, ids, records):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.type = np.array([record.type for record in records], dtype=object)
+        self.expr = np.array([record.expr for record in records], dtype=object)
+        self.name = np.array([record.name for record in records], dtype=object)
+
+        limits = [record.get_limit() for record in records]
+        limits = [limit[np.argsort(limit[:,0], kind="stable")] for limit in limits]
+        self.size = np.array([len(limit) for limit in limits], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.size)])
+        if limits:
+            self.mass = np.concatenate([limit[:,0] for limit in limits])
+            self.sigma_values = np.concatenate([limit[:,1] for limit in limits])
+        else:
+            self.mass = np.empty(0)
+            self.sigma_values = np.empty(0)
+        self.mass_min = self.mass[self.offsets[:-1]] if limits else np.empty(0)
+        self.mass_max = self.mass[self.offsets[1:] - 1] if limits else np.empty(0)
+
+        # every limit lives in its own unit interval of the search key, so
+        # one searchsorted locates a mass in all limits at once
+        if len(self.mass):
+            self._lo = np.log(self.mass.min())
+            self._span = max(np.log(self.mass.max()) - self._lo, 1.0)
+        else:
+            self._lo, self._span = 0.0, 1.0
+        rows = np.repeat(np.arange(len(limits)), self.size)
+        self._keys = rows + self._unit(self.mass)
+        self._log_mass = np.log(self.mass)
+        self._log_sigma = np.log(self.sigma_values)
+
+    def _unit(self, mass):
+        return 0.5 * np.clip((np.log(mass) - self._lo) / self._span, 0.0, 1.0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def padded(self, fill=np.nan):
+        """Limits as ``(n_limits, max_size, 2)`` array padded with ``fill``
+        """
+        n = len(self)
+        out = np.full((n, self.size.max() if n else 0, 2), fill)
+        rows = np.repeat(np.arange(n), self.size)
+        cols = np.arange(len(self.mass)) - self.offsets[rows]
+        out[rows, cols, 0] = self.mass
+        out[rows, cols, 1] = self.sigma_values
+        return out
+
+    def sigma(self, mass, extrapolate=False):
+        """Cross-section of every limit at ``mass``
+
+        Returns an ``(n_limits, n_masses)`` array, limits are interpolated
+        as power laws between their points, like ``DD.sigma``, and are NaN
+        outside their mass range unless ``extrapolate`` is set.
+        """
+        mass = np.atleast_1d(np.asarray(mass, dtype=np.float64))
+        n = len(self)
+        if n == 0:
+            return np.empty((0, mass.size))
+        rows = np.arange(n)[:, None]
+        keys = rows + self._unit(mass)[None, :]
+        left = np.searchsorted(self._keys, keys, side="right") - 1
+        first = self.offsets[:-1, None]
+        last = np.maximum(self.offsets[1:, None] - 2, first)
+        left = np.clip(left, first, last)
+        right = np.minimum(left + 1, self.offsets[1:, None] - 1)
+
+        x0, x1 = self._log_mass[left], self._log_mass[right]
+        y0, y1 = self._log_sigma[left], self._log_sigma[right]
+        slope = np.divide(y1 - y0, x1 - x0, out=np.zeros_like(y0), where=x1 > x0)
+        values = np.exp(y0 + (np.log(mass)[None, :] - x0) * slope)
+        if not extrapolate:
+            outside = (mass[None, :] < self.mass_min[:, None]) | (mass[None, :] > self.mass_max[:, None])
+            values[outside] = np.nan
+        return values
+
+    def envelope(self, mass):
+        """Strongest limit at each mass
+
+        Returns the smallest cross-section over the stack and the id of the
+        limit setting it, NaN and -1 where no limit covers the mass.
+        """
+        values = self.sigma(mass)
+        covered = ~np.all(np.isnan(values), axis=0)
+        best = np.full(values.shape[1], np.nan)
+        winner = np.full(values.shape[1], -1, dtype=np.int64)
+        if len(self):
+            index = np.argmin(np.where(np.isnan(values), np.inf, values), axis=0)
+            best[covered] = values[index[covered], np.flatnonzero(covered)]
+            winner[covered] = self.ids[index[covered]]
+        return best, winner
+
+    def experiments(self, mass):
+        """Name of the experiment setting the strongest limit at each mass,
+        None where no limit covers the mass
+        """
+        _, winner = self.envelope(mass)
+        lookup = dict(zip(self.ids.tolist(), self.expr))
+        return np.array([lookup.get(limit_id) for limit_id in winner.tolist()], dtype=object)
@@ -0,0 +1,125 @@
+"""Chunked readers and writers for large LHC limit files
+
+Readers yield ``(med_mass, chi_mass)`` array pairs of at most ``chunk_size``
+rows and writers append ``(n, ncol)`` blocks, so that translating a file
+only ever holds one chunk in memory, whatever its size.
+"""
+import gzip
+import numpy as np
+import struct
+
+
+def _is_npy(path):
+    return str(path).endswith(".npy")
+
+
+def _open_text(path, mode):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def read_masses(source, chunk_size=1_000_000, delimiter=",", skiprows=0):
+    """Iterate over ``(med_mass, chi_mass)`` chunks of a 2D limit file
+
+    Parameters
+    ----------
+    source: ``.npy`` file (memory-mapped), or text/CSV file, optionally gzipped (``.gz``),
+        with the mediator and dark matter masses as first and second columns
+    chunk_size: maximum number of rows per chunk
+    delimiter: column separator of text files, None for any whitespace
+    skiprows: number of header lines to skip in text files
+    """
+    if _is_npy(source):
+        data = np.load(source, mmap_mode="r")
+        for start in range(0, len(data), chunk_size):
+            block = np.asarray(data[start:start + chunk_size, :2], dtype=np.float64)
+            yield block[:,0], block[:,1]
+        return
+
+    import pandas as pd
+    reader = pd.read_csv(
+        source,
+        sep=delimiter if delimiter is not None else r"\s+",
+        header=None,
+        usecols=[0, 1],
+        comment="#",
+        skiprows=skiprows,
+        dtype=np.float64,
+        float_precision="round_trip",
+        chunksize=chunk_size,
+        compression="infer",
+    )
+    with reader:
+        for block in reader:
+            block = block.to_numpy()
+            yield block[:,0], block[:,1]
+
+
+class npy_writer:
+    """Append rows to a ``.npy`` file whose length is not known in advance
+
+    A fixed-size header is written first and patched with the final number
+    of rows on ``close``.
+    """
+    _header_size = 128
+
+    def __init__(self, path, ncol=2):
+        self.path = path
+        self.ncol = ncol
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+
+    def _header(self):
+        header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (self.rows, self.ncol)
+        header = header.ljust(self._header_size - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+    def write(self, block):
+        block = np.ascontiguousarray(block, dtype="<f8").reshape(-1, self.ncol)
+        self._file.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class text_writer:
+    """Append rows to a CSV/text file, gzipped if the name ends with ``.gz``
+    """
+    def __init__(self, path, delimiter=",", fmt="%.17g"):
+        self.path = path
+        self.rows = 0
+        self.delimiter = delimiter
+        self.fmt = fmt
+        self._file = _open_text(path, "w")
+
+    def write(self, block):
+        np.savetxt(self._file, block, delimiter=self.delimiter, fmt=self.fmt)
+        self.rows += len(block)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(path, ncol=2, delimiter=","):
+    """Writer for ``path``, ``.npy`` or text depending on the extension
+    """
+    if _is_npy(path):
+        return npy_writer(path, ncol)
+    return text_writer(path, delimiter or " ")
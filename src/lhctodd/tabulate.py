@@ -0,0 +1,250 @@
+"""Tabulated mediator widths for fast coupling scans
+
+The partial widths to quarks, leptons and gluons of ``theory.width`` are
+tabulated per unit coupling squared, as ``width / (g**2 * med_mass)``, on a
+dense logarithmic grid of mediator masses and evaluated by linear
+interpolation in ``log(med_mass)``. The grid has extra knots at every
+fermion pair threshold, geometrically refined above it, at the top quark
+threshold of the gluon channels and at the nodes of the alpha_s table, so
+that the kinks of the exact widths fall on knots.
+
+Within ``mass_min`` and ``mass_max``, and more than 1e-12 in relative
+distance away from a threshold, the maximum relative error of every
+table, measured against the analytic widths when the table is built, is
+below ``MAX_RELATIVE_ERROR`` (1e-4). Masses outside the tabulated range are
+evaluated analytically. The dark matter and neutrino channels only depend
+on ``chi_mass/med_mass`` through cheap closed forms and are always exact.
+
+Tables are built once and cached on disk, under ``$LHCTODD_CACHE`` or
+``~/.cache/lhctodd``, in a file keyed by the grid and by a hash of the
+alpha_s table and of the sources of the width kernels and of this module,
+so that changing any of them builds new tables.
+
+    >>> from lhctodd.tabulate import width_table
+    >>> table = width_table.load()
+    >>> table.scalar_total(np.geomspace(10, 5000, 10**6), 50.0, g_q=1.0)
+"""
+from .tools import __data_path__
+from .theory import width
+from . import theory
+from functools import lru_cache
+
+import hashlib
+import numpy as np
+import os
+from pathlib import Path
+
+
+MAX_RELATIVE_ERROR = 1e-4
+_loaded = {}
+
+# {table: (analytic partial width at unit coupling, thresholds, jump)}
+# thresholds are the masses where a channel opens, jump when it opens with
+# a finite width instead of a phase-space onset
+_channels = {
+    "vector_qq": (width.vector_qq, [2 * m for m in width._q_mass], False),
+    "vector_ll": (width.vector_ll, [2 * m for m in width._l_mass], False),
+    "axial_qq": (width.axial_qq, [2 * m for m in width._q_mass], False),
+    "axial_ll": (width.axial_ll, [2 * m for m in width._l_mass], False),
+    "scalar_qq": (width.scalar_qq, [2 * m for m in width._q_mass], True),
+    "scalar_gg": (width.scalar_gg, [2 * width._q_mass[5]], True),
+    "pseudo_scalar_qq": (width.pseudo_scalar_qq, [2 * m for m in width._q_mass], True),
+    "pseudo_scalar_gg": (width.pseudo_scalar_gg, [2 * width._q_mass[5]], True),
+}
+
+
+def _cache_dir():
+    return Path(os.environ.get("LHCTODD_CACHE", Path.home() / ".cache" / "lhctodd"))
+
+
+@lru_cache(maxsize=None)
+def fingerprint():
+    """Hash of the inputs of the tables: the alpha_s table, the width
+    kernels with their constants and the knot placement of this module
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for path in (__data_path__ / "alpha_s.csv", theory.__file__, __file__):
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def _knots(thresholds, jump, mass_min, mass_max, per_decade, extra=()):
+    decades = np.log10(mass_max / mass_min)
+    knots = [np.geomspace(mass_min, mass_max, int(np.ceil(decades * per_decade)) + 1), extra]
+    for threshold in thresholds:
+        if jump:
+            knots.append([threshold * (1 - 1e-12), threshold])
+        else:
+            # phase-space onsets go as (m - threshold)**(1/2) or **(3/2):
+            # knots spaced by 1% in the distance to the threshold
+            knots.append(threshold * (1 + np.concatenate([[0], np.geomspace(1e-12, 1, 2800)])))
+    knots = np.unique(np.concatenate(knots))
+    return knots[(knots >= mass_min) & (knots <= mass_max)]
+
+
+class width_table:
+    """Tabulated partial widths with the interface of ``theory.width``
+
+    Use ``width_table.load()`` to get the cached tables, ``build`` only
+    computes them. ``max_relative_error`` maps every table to its measured
+    maximum relative error.
+    """
+    def __init__(self, tables, mass_min, mass_max, max_relative_error):
+        self.mass_min = mass_min
+        self.mass_max = mass_max
+        self.max_relative_error = max_relative_error
+        self._tables = tables # {name: (log mass knots, width / (g**2 * mass))}
+
+    @classmethod
+    def build(cls, mass_min=1e-3, mass_max=1e5, per_decade=2000):
+        tables, errors = {}, {}
+        for name, (func, thresholds, jump) in _channels.items():
+            extra = width._as_data[:,0] if name.endswith("_gg") else ()
+            knots = _knots(thresholds, jump, mass_min, mass_max, per_decade, extra)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = func(knots) / knots
+            tables[name] = (np.log(knots), values)
+
+            # linear interpolation is worst half way between knots, the
+            # intervals of 1e-12 that straddle thresholds are left out
+            wide = np.diff(np.log(knots)) > 1e-11
+            middle = np.sqrt(knots[1:] * knots[:-1])[wide]
+            approx = np.interp(np.log(middle), *tables[name])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                exact = func(middle) / middle
+                error = np.where(exact > 0, np.abs(approx - exact) / exact, np.abs(approx))
+            errors[name] = float(error.max())
+            if errors[name] > MAX_RELATIVE_ERROR:
+                raise ValueError(
+                    f"{name} table error {errors[name]:.2g} above {MAX_RELATIVE_ERROR:g}, increase per_decade"
+                )
+        return cls(tables, mass_min, mass_max, errors)
+
+    @classmethod
+    def load(cls, mass_min=1e-3, mass_max=1e5, per_decade=2000, cache_dir=None):
+        """Tables read from the disk cache, built and stored if missing, and
+        kept in memory for the rest of the process
+        """
+        cache_dir = Path(cache_dir) if cache_dir is not None else _cache_dir()
+        path = cache_dir / f"widths-{fingerprint()}-{mass_min:g}-{mass_max:g}-{per_decade}.npz"
+        if path in _loaded:
+            return _loaded[path]
+        if path.exists():
+            with np.load(path) as data:
+                tables = {name: (data[f"{name}:mass"], data[f"{name}:width"]) for name in _channels}
+                errors = {name: float(data[f"{name}:error"]) for name in _channels}
+            _loaded[path] = cls(tables, mass_min, mass_max, errors)
+            return _loaded[path]
+
+        table = cls.build(mass_min, mass_max, per_decade)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for name, (mass, values) in table._tables.items():
+            arrays.update({f"{name}:mass": mass, f"{name}:width": values, f"{name}:error": table.max_relative_error[name]})
+        # written aside then renamed, concurrent builders never see a partial file
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+        _loaded[path] = table
+        return table
+
+    @staticmethod
+    def _log(med_mass):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.log(med_mass)
+
+    def _partial(self, name, med_mass, g, log_mass=None):
+        # log_mass: log(med_mass), shared by the channels of a total width
+        med_mass = np.asarray(med_mass, dtype=np.float64)
+        if log_mass is None:
+            log_mass = self._log(med_mass)
+        knots, values = self._tables[name]
+        scaled = np.interp(log_mass, knots, values, left=np.nan, right=np.nan)
+        outside = np.isnan(scaled)
+        if outside.any():
+            scaled = np.array(scaled, ndmin=1)
+            masses = np.array(med_mass, ndmin=1)[outside]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scaled[outside] = _channels[name][0](masses) / masses
+            scaled = scaled.reshape(np.shape(med_mass))
+        result = np.square(g) * med_mass * scaled
+        return result[()] if np.ndim(result) == 0 else result
+
+    # Vector mediators
+    def vector_qq(self, med_mass, g=1.0):
+        return self._partial("vector_qq", med_mass, g)
+
+    def vector_ll(self, med_mass, g=1.0):
+        return self._partial("vector_ll", med_mass, g)
+
+    def vector_nn(self, med_mass, g=1.0):
+        return width.vector_nn(med_mass, g)
+
+    def vector_dm(self, med_mass, chi_mass=1.0, g=1.0):
+        return width.vector_dm(med_mass, chi_mass, g)
+
+    def vector_total(self, med_mass, chi_mass, g_q=0.25, g_chi=1.0, g_l=0.0):
+        log_mass = self._log(med_mass)
+        return (
+            self._partial("vector_qq", med_mass, g_q, log_mass)
+            + self._partial("vector_ll", med_mass, g_l, log_mass)
+            + self.vector_nn(med_mass, g_l) + self.vector_dm(med_mass, chi_mass, g_chi)
+        )
+
+    # Axial-vector mediators
+    def axial_qq(self, med_mass, g=1.0):
+        return self._partial("axial_qq", med_mass, g)
+
+    def axial_ll(self, med_mass, g=1.0):
+        return self._partial("axial_ll", med_mass, g)
+
+    def axial_nn(self, med_mass, g=1.0):
+        return width.axial_nn(med_mass, g)
+
+    def axial_dm(self, med_mass, chi_mass=1.0, g=1.0):
+        return width.axial_dm(med_mass, chi_mass, g)
+
+    def axial_total(self, med_mass, chi_mass, g_q=0.25, g_dm=1.0, g_l=0.0):
+        log_mass = self._log(med_mass)
+        return (
+            self._partial("axial_qq", med_mass, g_q, log_mass)
+            + self._partial("axial_ll", med_mass, g_l, log_mass)
+            + self.axial_nn(med_mass, g_l) + self.axial_dm(med_mass, chi_mass, g_dm)
+        )
+
+    # Scalar mediators
+    def scalar_gg(self, med_mass, g=1.0):
+        return self._partial("scalar_gg", med_mass, g)
+
+    def scalar_qq(self, med_mass, g=1.0):
+        return self._partial("scalar_qq", med_mass, g)
+
+    def scalar_dm(self, med_mass, chi_mass=1.0, g=1.0):
+        return width.scalar_dm(med_mass, chi_mass, g)
+
+    def scalar_total(self, med_mass, chi_mass=1.0, g_q=0.25, g_dm=1.0):
+        log_mass = self._log(med_mass)
+        return (
+            self._partial("scalar_qq", med_mass, g_q, log_mass)
+            + self._partial("scalar_gg", med_mass, g_q, log_mass)
+            + self.scalar_dm(med_mass, chi_mass, g_dm)
+        )
+
+    # Pseudo-scalar mediators
+    def pseudo_scalar_gg(self, med_mass, g=1.0):
+        return self._partial("pseudo_scalar_gg", med_mass, g)
+
+    def pseudo_scalar_qq(self, med_mass, g=1.0):
+        return self._partial("pseudo_scalar_qq", med_mass, g)
+
+    def pseudo_scalar_dm(self, med_mass, chi_mass=1.0, g=1.0):
+        return width.pseudo_scalar_dm(med_mass, chi_mass, g)
+
+    def pseudo_scalar_total(self, med_mass, chi_mass=1.0, g_q=0.25, g_g=0.0, g_dm=1.0):
+        log_mass = self._log(med_mass)
+        return (
+            self._partial("pseudo_scalar_qq", med_mass, g_q, log_mass)
+            + self._partial("pseudo_scalar_gg", med_mass, g_q, log_mass)
+            + self.pseudo_scalar_dm(med_mass, chi_mass, g_dm)
+        )
@@ -1,7 +1,14 @@
 from .tools import __data_path__
-from scipy import interpolate
+from .tools import lazy_attribute
+from .interp import loglog
+from .instrument import counted
 import numpy as np
 
+
+def _masses(cls, med_mass, *args, **kwargs):
+    return np.size(med_mass)
+
+
 class width:
     # quark masses from PDG 2020
     _q_mass = [
@@ -15,127 +22,202 @@ class width:
     # lepton masses: e mu tau from PDG 2020
     _l_mass = [0.000511, 0.105658, 1.77682]
     _vev = 246
-    
-    # fermion-Yukawa-Coupling function 
+
+    # fermion-Yukawa-Coupling function
     _fyc = lambda mf: np.sqrt(2)*mf/246.0
-    
-    # fetch alpha_s values taken from NNPDF31
-    _as_data = np.genfromtxt(
-        str( __data_path__ / f"alpha_s.csv"),
-        delimiter=","
-    )
-    _as = interpolate.interp1d(
-        _as_data[:,0], # scale
-        _as_data[:,1], # alpha_s value
-        fill_value="extrapolate"
-    )
+
+    # fetch alpha_s values taken from NNPDF31, loaded on first use
+    @lazy_attribute
+    def _as_data(cls):
+        return np.genfromtxt(
+            str( __data_path__ / f"alpha_s.csv"),
+            delimiter=","
+        )
+
+    @lazy_attribute
+    def _as(cls):
+        return loglog(
+            cls._as_data[:,0], # scale
+            cls._as_data[:,1], # alpha_s value
+            extrapolate="power"
+        )
+
+    @classmethod
+    def tabulated(cls, **grid):
+        """Tabulated version of these widths, see ``lhctodd.tabulate``
+        """
+        from .tabulate import width_table
+        return width_table.load(**grid)
+
+    # Phase-space factor of a fermion pair for each mediator, written as
+    # sum(c * t**p) with t = 1 - 4*z**n and z = (m_f/m_med)**2:
+    # {kind: (n, [(c, p), ...])}
+    _phase_space_terms = {
+        "vector": (1, [(1.5, 0.5), (-0.5, 1.5)]),  # sqrt(1-4z) * (1+2z)
+        "axial": (1, [(1.0, 1.5)]),                # (1-4z)**(3/2)
+        "scalar": (2, [(1.0, 1.5)]),               # (1-4z**2)**(3/2)
+        "pseudo": (2, [(1.0, 0.5)]),               # (1-4z**2)**(1/2)
+    }
+
+    @classmethod
+    def _fermions(cls, kind, med_mass, channels, out=None, work=None):
+        """Sum of fermion-pair partial widths, broadcast over a flavour axis
+
+        Computes ``sum_c g_c**2 * med_mass * sum_f w_f * phase_space(m_f)``
+        for channels ``c`` given as ``(masses, weights, g)``, where ``masses``
+        are flavour masses (scalars or arrays broadcasting with
+        ``med_mass``). Every flavour is evaluated in a single
+        ``(n_flavours, ...)`` real-valued workspace, channels below the
+        ``2 m_f`` threshold contributing zero.
+
+        out: array receiving the result
+        work: ``(n_flavours,) + shape`` float64 workspace, reused between calls
+        """
+        med_mass = np.asarray(med_mass, dtype=np.float64)
+        masses, weights, couplings = [], [], []
+        for channel, (m, w, g) in enumerate(channels):
+            for mass, weight in zip(m, np.broadcast_to(w, (len(m),))):
+                masses.append(mass)
+                row = np.zeros(len(channels))
+                row[channel] = weight
+                weights.append(row)
+            couplings.append(g)
+        shape = np.broadcast(med_mass, *masses).shape
+        if work is None:
+            work = np.empty((len(masses),) + shape)
+        elif work.shape != (len(masses),) + shape:
+            raise ValueError(f"work should have shape {(len(masses),) + shape}, not {work.shape}")
+        weights = np.array(weights).T # (n_channels, n_flavours)
+
+        # fold scalar couplings in the weights, to reduce on a single row
+        if all(np.ndim(g) == 0 for g in couplings):
+            weights = (weights * np.square(couplings)[:, None]).sum(axis=0, keepdims=True)
+            couplings = None
+
+        # z = (m_f/m_med)**2, with constant masses filled in one broadcast
+        flat = [i for i, mass in enumerate(masses) if np.ndim(mass) == 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if len(flat) == len(masses):
+                np.divide(
+                    np.reshape(masses, (-1,) + (1,) * len(shape)),
+                    med_mass, out=work
+                )
+            else:
+                for i, mass in enumerate(masses):
+                    np.divide(mass, med_mass, out=work[i])
+        np.square(work, out=work)
+
+        n, terms = cls._phase_space_terms[kind]
+        if n == 2:
+            # below threshold (z > 1/4) 1-4z**2 is not negative yet
+            np.copyto(work, np.inf, where=work > 0.25)
+            np.square(work, out=work)
+        work *= -4
+        work += 1
+        np.maximum(work, 0, out=work)
+
+        result = None
+        power = 1.0
+        for c, p in terms:
+            np.power(work, p / power, out=work)
+            power = p
+            term = np.einsum("cf,f...->c...", c * weights, work)
+            result = term if result is None else result + term
+        result *= med_mass
+
+        if couplings is None:
+            result = result[0]
+        else:
+            result = sum(np.square(g) * r for g, r in zip(couplings, result))
+        if out is not None:
+            out[...] = result
+            return out
+        return result[()] if np.ndim(result) == 0 else result
 
     # Vector mediators
     @classmethod
-    def vector_qq(cls, med_mass, g=1.0):
-        """ Width of vector mediator decaying to quarks        
+    @counted("width.vector_qq", size=_masses)
+    def vector_qq(cls, med_mass, g=1.0, out=None, work=None):
+        """ Width of vector mediator decaying to quarks
         """
-        width = 0
-        for mass in cls._q_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass,
-                g**2 * med_mass * np.sqrt(1 - 4*z) * (1 + 2*z) / (4*np.pi),
-                0.0 
-            )
-        return np.abs(width)
-
-    @classmethod
-    def vector_ll(cls, med_mass, g=1.0):
+        return cls._fermions(
+            "vector", med_mass, [(cls._q_mass, 1 / (4*np.pi), g)], out, work
+        )
+
+    @classmethod
+    @counted("width.vector_ll", size=_masses)
+    def vector_ll(cls, med_mass, g=1.0, out=None, work=None):
         """Width of vector mediator decaying to leptons
         """
-        width = 0
-        for mass in cls._l_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass,
-                g**2 * med_mass * np.sqrt(1 - 4*z) * (1 + 2*z) / (12*np.pi),
-                0.0 
-            )
-        return np.abs(width)
+        return cls._fermions(
+            "vector", med_mass, [(cls._l_mass, 1 / (12*np.pi), g)], out, work
+        )
 
     @classmethod
+    @counted("width.vector_nn", size=_masses)
     def vector_nn(cls, med_mass, g=1.0):
         """Width of vector mediator decaying to neutrinos
         """
         return g**2 * med_mass / (24*np.pi)
 
     @classmethod
-    def vector_dm(cls, med_mass, chi_mass=1.0, g=1.0):
-        """Width of vector mediator decaying to dark matter candidates 
+    @counted("width.vector_dm", size=_masses)
+    def vector_dm(cls, med_mass, chi_mass=1.0, g=1.0, out=None, work=None):
+        """Width of vector mediator decaying to dark matter candidates
         """
-        z = np.divide(chi_mass, med_mass)**2
-        z = z.astype(np.complex128)
-        return np.abs(np.where(
-            med_mass >= 2 * chi_mass, 
-            g**2 * med_mass * np.sqrt(1 - 4*z) * (1 + 2*z) / (12*np.pi),
-            0.0
-        ))
+        return cls._fermions(
+            "vector", med_mass, [([chi_mass], 1 / (12*np.pi), g)], out, work
+        )
 
     @classmethod
-    def vector_total(cls, med_mass, chi_mass, g_q=0.25, g_chi=1.0, g_l=0.0):
-        """Total width of the vector mediator
+    @counted("width.vector_total", size=_masses)
+    def vector_total(cls, med_mass, chi_mass, g_q=0.25, g_chi=1.0, g_l=0.0, out=None, work=None):
+        """Total width of the vector mediator, all channels in one pass
         """
-        total  = cls.vector_qq(med_mass, g_q)
-        total += cls.vector_ll(med_mass, g_l)
+        total = cls._fermions("vector", med_mass, [
+            (cls._q_mass, 1 / (4*np.pi), g_q),
+            (cls._l_mass, 1 / (12*np.pi), g_l),
+            ([chi_mass], 1 / (12*np.pi), g_chi),
+        ], out, work)
         total += cls.vector_nn(med_mass, g_l)
-        total += cls.vector_dm(med_mass, chi_mass, g_chi)
         return total
-    
+
     #Axial-Vector Mediators
     @classmethod
-    def axial_qq(cls, med_mass, g = 1.0):
-        width = 0
-        for mass in cls._q_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass,
-                g**2 * med_mass * np.sqrt(1 - 4*z)**3 / (4*np.pi),
-                0.0 
-            )
-        return np.abs(width)
-
-    @classmethod
-    def axial_ll(cls, med_mass, g = 1.0):
-        width = 0
-        for mass in cls._l_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass,
-                g**2 * med_mass * np.sqrt(1 - 4*z)**3 / (12*np.pi),
-                0.0 
-            )
-        return np.abs(width)
+    @counted("width.axial_qq", size=_masses)
+    def axial_qq(cls, med_mass, g = 1.0, out=None, work=None):
+        return cls._fermions(
+            "axial", med_mass, [(cls._q_mass, 1 / (4*np.pi), g)], out, work
+        )
+
+    @classmethod
+    @counted("width.axial_ll", size=_masses)
+    def axial_ll(cls, med_mass, g = 1.0, out=None, work=None):
+        return cls._fermions(
+            "axial", med_mass, [(cls._l_mass, 1 / (12*np.pi), g)], out, work
+        )
 
     @classmethod
+    @counted("width.axial_nn", size=_masses)
     def axial_nn(cls, med_mass, g = 1.0):
         return g**2 * med_mass / (24*np.pi)
 
     @classmethod
-    def axial_dm(cls, med_mass, chi_mass=1.0, g = 1.0):
-        z = np.divide(chi_mass, med_mass)**2
-        z = z.astype(np.complex128)
-        return np.abs(np.where(
-            med_mass >= 2 * chi_mass, 
-            g**2 * med_mass * np.sqrt(1 - 4*z)**3 / (12*np.pi),
-            0.0
-        ))
+    @counted("width.axial_dm", size=_masses)
+    def axial_dm(cls, med_mass, chi_mass=1.0, g = 1.0, out=None, work=None):
+        return cls._fermions(
+            "axial", med_mass, [([chi_mass], 1 / (12*np.pi), g)], out, work
+        )
 
     @classmethod
-    def axial_total(cls, med_mass, chi_mass, g_q=0.25, g_dm=1.0, g_l=0.0):
-        total  = cls.axial_qq(med_mass, g_q)
-        total += cls.axial_ll(med_mass, g_l)
+    @counted("width.axial_total", size=_masses)
+    def axial_total(cls, med_mass, chi_mass, g_q=0.25, g_dm=1.0, g_l=0.0, out=None, work=None):
+        total = cls._fermions("axial", med_mass, [
+            (cls._q_mass, 1 / (4*np.pi), g_q),
+            (cls._l_mass, 1 / (12*np.pi), g_l),
+            ([chi_mass], 1 / (12*np.pi), g_dm),
+        ], out, work)
         total += cls.axial_nn(med_mass, g_l)
-        total += cls.axial_dm(med_mass, chi_mass, g_dm)
         return total
 
     # Scalar Mediators
@@ -144,105 +226,82 @@ class width:
         return tau * (
             1 + (1 - tau)* np.arctan(np.divide(1, np.sqrt(tau - 1)))**2
         )
-    def from_factor_ps(tau):
+    def form_factor_ps(tau):
         tau = tau.astype(np.complex128)
         return np.abs(tau * np.arctan(np.divide(1, np.sqrt(tau - 1)))**2)
+    from_factor_ps = form_factor_ps
 
     @classmethod
-    def scalar_qq(cls, med_mass, g=1.0):
-        width = 0
-        for mass in cls._q_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass,
-                3 * g**2 * cls._fyc(mass)**2 * med_mass * np.sqrt(1 - 4*z)**3 / (16*np.pi),
-                0.0
-            )
-        return np.abs(width)
-    
+    def _yukawa_weights(cls):
+        return 3 * cls._fyc(np.array(cls._q_mass))**2 / (16*np.pi)
+
     @classmethod
+    @counted("width.scalar_gg", size=_masses)
     def scalar_gg(cls, med_mass, g=1.0):
         z = np.divide(cls._q_mass[5], med_mass)**2
         z = z.astype(np.complex128)
         return np.abs(g**2 * med_mass**3 * cls._as(med_mass)**2 * np.where(
-            med_mass >= 2 * cls._q_mass[5], 
+            med_mass >= 2 * cls._q_mass[5],
             cls.form_factor_s(4*z)**2 / (32*np.pi**3 * cls._vev**2),
             0.0
         ))
 
     @classmethod
-    def scalar_qq(cls, med_mass, g=1.0):
-        width = 0
-        for mass in cls._q_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass, 
-                3 * g**2 * cls._fyc(mass)**2 * med_mass * np.sqrt(1 - 4*z**2)**3 / (16*np.pi),
-                0.0
-            )
-        return np.abs(width)
+    @counted("width.scalar_qq", size=_masses)
+    def scalar_qq(cls, med_mass, g=1.0, out=None, work=None):
+        return cls._fermions(
+            "scalar", med_mass, [(cls._q_mass, cls._yukawa_weights(), g)], out, work
+        )
 
     @classmethod
-    def scalar_dm(cls, med_mass, chi_mass=1.0, g=1.0):
-        z = np.divide(chi_mass, med_mass)**2
-        z = z.astype(np.complex128)
-        return np.abs(
-            g**2 * med_mass * np.where(
-                med_mass >= 2 * chi_mass,
-                np.sqrt(1 - 4 * z**2)**3 / (8 * np.pi),
-                0.0
-            )
+    @counted("width.scalar_dm", size=_masses)
+    def scalar_dm(cls, med_mass, chi_mass=1.0, g=1.0, out=None, work=None):
+        return cls._fermions(
+            "scalar", med_mass, [([chi_mass], 1 / (8*np.pi), g)], out, work
         )
-    
+
     @classmethod
-    def scalar_total(cls, med_mass, chi_mass=1.0, g_q=0.25, g_dm=1.0):
-        total = cls.scalar_dm(med_mass, chi_mass, g_dm)
+    @counted("width.scalar_total", size=_masses)
+    def scalar_total(cls, med_mass, chi_mass=1.0, g_q=0.25, g_dm=1.0, out=None, work=None):
+        total = cls._fermions("scalar", med_mass, [
+            (cls._q_mass, cls._yukawa_weights(), g_q),
+            ([chi_mass], 1 / (8*np.pi), g_dm),
+        ], out, work)
         total += cls.scalar_gg(med_mass, g_q)
-        total += cls.scalar_qq(med_mass, g_q)
         return total
 
     # pseudo-scalar mediators
     @classmethod
+    @counted("width.pseudo_scalar_gg", size=_masses)
     def pseudo_scalar_gg(cls, med_mass, g=1.0):
         z = np.divide(cls._q_mass[5], med_mass)**2
         z = z.astype(np.complex128)
         return np.abs(g**2 * med_mass**3 * cls._as(med_mass)**2 * np.where(
-            med_mass >= 2 * cls._q_mass[5], 
+            med_mass >= 2 * cls._q_mass[5],
             cls.form_factor_ps(4*z)**2 / (32*np.pi**3 * cls._vev**2),
             0.0
         ))
 
     @classmethod
-    def pseudo_scalar_qq(cls, med_mass, g=1.0):
-        width = 0
-        for mass in cls._q_mass:
-            z = np.divide(mass, med_mass)**2
-            z = z.astype(np.complex128)
-            width += np.where(
-                med_mass >= 2 * mass, 
-                3 * g**2 * cls._fyc(mass)**2 * med_mass * np.sqrt(1 - 4*z**2)/ (16*np.pi),
-                0.0
-            )
-        return np.abs(width)
+    @counted("width.pseudo_scalar_qq", size=_masses)
+    def pseudo_scalar_qq(cls, med_mass, g=1.0, out=None, work=None):
+        return cls._fermions(
+            "pseudo", med_mass, [(cls._q_mass, cls._yukawa_weights(), g)], out, work
+        )
 
     @classmethod
-    def pseudo_scalar_dm(cls, med_mass, chi_mass=1.0, g=1.0):
-        z = np.divide(chi_mass, med_mass)**2
-        z = z.astype(np.complex128)
-        return np.abs(
-            g**2 * med_mass * np.where(
-                med_mass >= 2 * chi_mass,
-                np.sqrt(1 - 4 * z**2) / (8 * np.pi),
-                0.0
-            )
+    @counted("width.pseudo_scalar_dm", size=_masses)
+    def pseudo_scalar_dm(cls, med_mass, chi_mass=1.0, g=1.0, out=None, work=None):
+        return cls._fermions(
+            "pseudo", med_mass, [([chi_mass], 1 / (8*np.pi), g)], out, work
         )
-    
+
     @classmethod
-    def pseudo_scalar_total(cls, med_mass, chi_mass=1.0, g_q=0.25, g_g=0.0, g_dm=1.0):
-        total = cls.pseudo_scalar_dm(med_mass, chi_mass, g_dm)
+    @counted("width.pseudo_scalar_total", size=_masses)
+    def pseudo_scalar_total(cls, med_mass, chi_mass=1.0, g_q=0.25, g_g=0.0, g_dm=1.0, out=None, work=None):
+        total = cls._fermions("pseudo", med_mass, [
+            (cls._q_mass, cls._yukawa_weights(), g_q),
+            ([chi_mass], 1 / (8*np.pi), g_dm),
+        ], out, work)
         total += cls.pseudo_scalar_gg(med_mass, g_q)
-        total += cls.pseudo_scalar_qq(med_mass, g_q)
         return total
-
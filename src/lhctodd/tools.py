@@ -1,13 +1,37 @@
+from .instrument import counted
 import numpy as np
+import json
+import math
 import os
+import struct
 from pathlib import Path
 
 class dd_format:
+    """Direct detection limit record
+
+    Records are stored in the database with a versioned binary layout::
+
+        header   magic, version, header size, dtype, rows, columns,
+                 metadata offset and metadata length (32 bytes)
+        payload  rows x columns little-endian float64 values
+        metadata utf-8 JSON with cite, year, type, expr and name
+
+    so that ``from_buffer`` can hand out the limit as a read-only view on the
+    stored bytes, without copying them and without unpickling anything.
+    """
+    magic = b"LHDD"
+    version = 1
+    dtype = "<f8"
+    _header = struct.Struct("<4sHH4sIIII4x")
+    _meta_fields = ("cite", "year", "type", "expr", "name")
+
     def __init__(self, limit, meta):
+        limit = np.array(limit, dtype=self.dtype)
+        limit.flags.writeable = False
         self.ncol = limit.shape[1]
         self.size = limit.shape[0]
 
-        self.limit = limit.tobytes()
+        self.limit = limit
         self.cite = meta.get("cite", "None")
         self.year = meta.get("year", "None")
         self.type = meta.get("type", "None")
@@ -15,11 +39,104 @@ class dd_format:
         self.name = meta.get("name", "None")
 
     def get_limit(self):
-        limit = np.frombuffer(self.limit, dtype=np.float64)
-        return limit.reshape(self.size, self.ncol)
+        return self.limit
+
+    def meta(self):
+        return {field: getattr(self, field) for field in self._meta_fields}
+
+    def to_bytes(self):
+        payload = np.ascontiguousarray(self.limit, dtype=self.dtype).tobytes()
+        meta = json.dumps(self.meta()).encode("utf-8")
+        header = self._header.pack(
+            self.magic,
+            self.version,
+            self._header.size,
+            self.dtype.encode("ascii"),
+            self.size,
+            self.ncol,
+            self._header.size + len(payload),
+            len(meta)
+        )
+        return header + payload + meta
+
+    @classmethod
+    @counted("records.decoded", nbytes=lambda cls, buffer, owner=None: len(buffer))
+    def from_buffer(cls, buffer, owner=None):
+        """Decode a record from bytes or a memoryview
+
+        The limit array is a read-only view on ``buffer``, ``owner`` is kept
+        on the record to hold whatever keeps that memory valid (e.g. the
+        LMDB transaction a buffer was read from).
+        """
+        buffer = memoryview(buffer)
+        if len(buffer) < cls._header.size:
+            raise ValueError("record is too short to be a dd_format record")
+        magic, version, offset, dtype, size, ncol, meta_offset, meta_length = \
+            cls._header.unpack_from(buffer)
+        if magic != cls.magic:
+            raise ValueError(
+                "unknown record format, pickled databases have to be converted "
+                "with `python -m lhctodd.migrate`"
+            )
+        if version != cls.version:
+            raise ValueError(f"unsupported dd_format version {version}")
+
+        record = cls.__new__(cls)
+        record.ncol = ncol
+        record.size = size
+        limit = np.frombuffer(
+            buffer,
+            dtype=dtype.rstrip(b"\0").decode("ascii"),
+            count=size * ncol,
+            offset=offset
+        )
+        record.limit = limit.reshape(size, ncol)
+        meta = json.loads(bytes(buffer[meta_offset:meta_offset + meta_length]))
+        for field in cls._meta_fields:
+            setattr(record, field, meta.get(field, "None"))
+        record._owner = owner
+        return record
+
+    def detach(self):
+        """Copy the limit out of the buffer the record was decoded from and
+        drop its owner, so that the record outlives that memory
+        """
+        limit = np.array(self.limit)
+        limit.flags.writeable = False
+        self.limit = limit
+        self._owner = None
 
     def __str__(self):
         return "https://arxiv.org/abs/{0} {1} {2}".format(self.cite, self.type, self.name)
 
 
+def json_number(value):
+    """``value`` for strict JSON, which has no NaN/inf: None when not finite
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def record_metadata(limit_id, record):
+    """Metadata of a ``dd_format`` record as a dict, shown by the command
+    line and the HTTP service
+    """
+    return dict(id=limit_id, type=record.type, expr=record.expr, name=record.name, cite=record.cite, year=record.year)
+
+
+class lazy_attribute:
+    """Class attribute computed by ``func(cls)`` on first access, then cached
+    on the class, for data that is too costly to load at import time
+    """
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, obj, owner):
+        value = self.func(owner)
+        setattr(owner, self.name, value)
+        return value
+
+
 __data_path__ = Path(os.path.join(os.path.dirname(__file__), "data"))
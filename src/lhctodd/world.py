@@ -0,0 +1,176 @@
+"""World-limit envelopes stored in the limit database
+
+For each limit ``type`` the strongest cross-section over all the limits of
+that type, and the id of the limit setting it, is tabulated on the fixed
+log-mass grid ``GRID`` and stored as a ``dd_format`` record with columns
+``(mass, sigma, id)`` in the ``meta:envelope`` sub-database, NaN and -1
+where no limit covers a mass.
+
+``ingest`` keeps the envelopes up to date in the transaction writing the
+limits, recomputing only the grid masses covered by the added, replaced or
+removed records. ``lhctodd.envelope("SI")`` reads the stored envelope and
+returns an object used like a ``DD``:
+
+    >>> world = lhctodd.envelope("SI")
+    >>> world.sigma([10, 100, 1000])
+    >>> world.experiments([10, 100, 1000])
+    >>> world.plot()
+
+    python -m lhctodd.world [path/to/darkmatter-data]   # rebuild all envelopes
+"""
+from .tools import __data_path__
+from .tools import dd_format
+from .index import ENVELOPE_DB, index_value, open_envelopes, open_indexes, record_key
+from .interp import loglog
+from .model import DD
+from .registry import open_env, release_env, registry as _registry
+from .stack import LimitStack
+
+import numpy as np
+import sys
+
+
+GRID = np.geomspace(1e-2, 1e6, 1601)  # 200 masses per decade
+
+
+def _type_ids(txn, dbs, limit_type):
+    cursor = txn.cursor(db=dbs["type"])
+    if not cursor.set_key(index_value(limit_type)):
+        return []
+    return [int(bytes(key)) for key in cursor.iternext_dup()]
+
+
+def _record(limit_type, values):
+    return dd_format(values, {"type": limit_type, "expr": "envelope", "name": f"{limit_type} world limit"})
+
+
+def update(env, txn, dbs, limit_type, mass_min=None, mass_max=None):
+    """Recompute the stored envelope of ``limit_type`` between ``mass_min``
+    and ``mass_max``, everywhere if they are not given or nothing is stored
+    yet, inside the write transaction ``txn``
+    """
+    db = open_envelopes(env, txn=txn, create=True)
+    key = index_value(limit_type)
+    stored = txn.get(key, db=db)
+    values = None
+    if stored is not None:
+        values = np.array(dd_format.from_buffer(stored).get_limit())
+        if values.shape != (len(GRID), 3) or not np.array_equal(values[:,0], GRID):
+            values = None
+    if values is None or mass_min is None:
+        values = np.column_stack([GRID, np.full(len(GRID), np.nan), np.full(len(GRID), -1.0)])
+        mass_min, mass_max = GRID[0], GRID[-1]
+
+    bins = (GRID >= mass_min) & (GRID <= mass_max)
+    if bins.any():
+        records = {}
+        for limit_id in _type_ids(txn, dbs, limit_type):
+            record = dd_format.from_buffer(txn.get(record_key(limit_id)))
+            mass = record.get_limit()[:,0]
+            if mass.max() >= mass_min and mass.min() <= mass_max:
+                records[limit_id] = record
+        best, winner = LimitStack.from_records(records.values(), ids=list(records)).envelope(GRID[bins])
+        values[bins, 1] = best
+        values[bins, 2] = winner
+    txn.put(key, _record(limit_type, values).to_bytes(), db=db)
+
+
+def build_envelopes(path=None):
+    """(Re)compute the envelopes of every limit type of a database
+    """
+    if path is None:
+        path = __data_path__ / "darkmatter-data"
+    env = open_env(path, write=True)
+    try:
+        with env.begin(write=True) as txn:
+            dbs = open_indexes(env, txn=txn, create=True)
+            types = [bytes(key).decode("utf-8") for key in txn.cursor(db=dbs["type"]).iternext_nodup(values=False)]
+            for limit_type in types:
+                update(env, txn, dbs, limit_type)
+    finally:
+        del env
+        release_env(path)
+    return types
+
+
+def load(limit_type="SI", registry=None):
+    """Stored envelope record of ``limit_type``, computed on the fly for
+    databases without stored envelopes
+    """
+    registry = registry if registry is not None else _registry
+    db = registry.envelopes
+    if db is not None:
+        with registry.reader() as txn:
+            raw = txn.get(index_value(limit_type), db=db)
+            if raw is not None:
+                return dd_format.from_buffer(bytes(raw))
+    ids = registry.query(type=limit_type)
+    if not ids:
+        raise KeyError(f"no limit of type {limit_type!r}")
+    best, winner = LimitStack(ids, registry=registry).envelope(GRID)
+    return _record(limit_type, np.column_stack([GRID, best, winner]))
+
+
+class world_limit(DD):
+    """Envelope of all the limits of a type, used like a ``DD``
+
+    Outside the masses covered by at least one limit ``sigma`` gives NaN
+    unless another ``extrapolate`` policy is chosen.
+    """
+    def __init__(self, limit_type="SI", registry=None, extrapolate="nan"):
+        self.extrapolate = extrapolate
+        self._registry = registry
+        self._data = load(limit_type, registry)
+        values = self._data.get_limit()
+        covered = ~np.isnan(values[:,1])
+        self._limit = values[covered, :2]
+        self._winner = values[covered, 2].astype(np.int64)
+        self.id = None
+        self.name = self._data.name
+        self.type = self._data.type
+        self.expr = self._data.expr
+        self.cite = None
+        self._func = loglog(self._limit[:,0], self._limit[:,1])
+
+    def __reduce__(self):
+        return (type(self), (self.type, None, self.extrapolate))
+
+    def data(self):
+        return self._limit
+
+    def winners(self, mass):
+        """Id of the limit setting the envelope at each mass, -1 where no limit covers it
+        """
+        mass = np.asarray(mass, dtype=np.float64)
+        if not len(self._limit):
+            return np.full(mass.shape, -1, dtype=np.int64)
+        # nearest grid mass, in log
+        log_grid = np.log(self._limit[:,0])
+        index = np.clip(np.searchsorted(log_grid, np.log(mass)), 1, len(log_grid) - 1)
+        index -= np.log(mass) - log_grid[index - 1] < log_grid[index] - np.log(mass)
+        inside = (mass >= self._limit[0,0]) & (mass <= self._limit[-1,0])
+        return np.where(inside, self._winner[index], -1)
+
+    def experiments(self, mass):
+        """Name of the experiment setting the envelope at each mass, None where no limit covers it
+        """
+        registry = self._registry if self._registry is not None else _registry
+        names = {-1: None}
+        winners = np.atleast_1d(self.winners(mass))
+        for limit_id in set(winners.tolist()) - {-1}:
+            names[limit_id] = registry.get(limit_id).expr
+        return np.array([names[limit_id] for limit_id in winners.tolist()], dtype=object)
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame({"mass": self._limit[:,0], "sigma": self._limit[:,1], "id": self._winner})
+
+
+def envelope(limit_type="SI", registry=None, extrapolate="nan"):
+    """Strongest limit of ``limit_type`` at each mass, see ``world_limit``
+    """
+    return world_limit(limit_type, registry, extrapolate)
+
+
+if __name__ == "__main__":
+    print(build_envelopes(sys.argv[1] if len(sys.argv) > 1 else None))
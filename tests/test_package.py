@@ -1,4 +1,19 @@
 import lhctodd as m
+import json
+import lmdb
+import numpy as np
+import os
+import pickle
+import pytest
+import subprocess
+import sys
+from lhctodd import grid
+from lhctodd.batch import translate_batch
+from lhctodd.cli import main as cli
+from lhctodd.ingest import ingest
+from lhctodd.interp import loglog
+from lhctodd.migrate import migrate
+from lhctodd.registry import limit_registry
 
 
 def test_version():
@@ -10,6 +25,548 @@ def test_data():
     except:
         raise RuntimeError('Failed to fetch data from database')
 
+def test_registry():
+    limit = m.DD(arxiv="1805.12562")
+    assert limit.type == "SI"
+    assert m.registry.get(1006) is limit._data
+    assert m.DD(1006)._func is limit._func
+    m.registry.invalidate()
+    assert m.registry.get(1006) is not limit._data
+    m.registry.reload()
+    assert m.DD(1006).sigma(100) == limit.sigma(100)
+
+def test_query():
+    assert m.query(type="SI", expr="XENON", year_min=2018) == [1006]
+    assert m.query(type="SD", year_max=2016) == [1002, 1005, 1007]
+    assert m.query(cite="1805.12562") == [1006]
+    assert m.registry.search("PICO") == [1002]
+    assert m.DD(pattern="PICO").name == m.registry.get(1002).name
+    assert len(m.registry.keys()) == len(m.query())
+
+def test_record_format(tmp_path):
+    limit = np.array([[1.0, 1e-40], [10.0, 1e-45], [100.0, 1e-44]])
+    record = m.dd_format(limit, {"cite": "0000.00000", "year": 2020, "type": "SI", "expr": "TEST", "name": "Test"})
+    decoded = m.dd_format.from_buffer(record.to_bytes())
+    assert np.array_equal(decoded.get_limit(), limit)
+    assert decoded.meta() == record.meta()
+    assert not m.DD(1006).data().flags.writeable
+
+    # legacy pickled record, converted by the migration tool
+    legacy = m.dd_format.__new__(m.dd_format)
+    legacy.__dict__.update(record.meta(), limit=limit.tobytes(), size=3, ncol=2)
+    env = lmdb.open(str(tmp_path / "db"))
+    with env.begin(write=True) as txn:
+        txn.put(b"00000001", pickle.dumps(legacy))
+    env.close()
+    with pytest.raises(ValueError):
+        limit_registry(tmp_path / "db").get(1)
+    assert migrate(tmp_path / "db") == 1
+    registry = limit_registry(tmp_path / "db")
+    assert np.array_equal(registry.get(1).get_limit(), limit)
+    assert registry.query(expr="TEST") == [1]
+
+def test_limit_stack():
+    stack = m.LimitStack(type="SI")
+    mass = np.logspace(0, 4, 500)
+    values = stack.sigma(mass)
+    assert values.shape == (len(m.query(type="SI")), len(mass))
+    for row, limit_id in enumerate(stack.ids):
+        inside = ~np.isnan(values[row])
+        assert np.allclose(values[row][inside], m.DD(limit_id).sigma(mass[inside]))
+    best, winner = stack.envelope(mass)
+    assert np.allclose(best, np.nanmin(values, axis=0))
+    assert set(winner) <= set(stack.ids)
+    assert stack.experiments([100])[0] == "XENON1T"
+    records = m.LimitStack.from_records([m.registry.get(i) for i in stack.ids], ids=stack.ids)
+    assert np.array_equal(records.sigma(mass), values, equal_nan=True)
+    assert list(m.LimitStack.from_records([m.registry.get(1006)]).ids) == [0]
+
+def test_loglog():
+    func = loglog([1.0, 10.0, 100.0], [1e-40, 1e-42, 1e-41])
+    assert np.isclose(func(10.0), 1e-42)
+    assert np.isclose(func(np.sqrt(10.0)), 1e-41)
+    assert np.allclose(func([1.0, 10.0, 100.0]), [1e-40, 1e-42, 1e-41])
+    assert np.isclose(func(1000.0), 1e-40)
+    assert np.isclose(func(1000.0, "clamp"), 1e-41)
+    assert np.isnan(func(1000.0, "nan"))
+    assert np.allclose(func([0.1, 1000.0], "clamp"), [1e-40, 1e-41])
+    assert np.isnan(func([0.1, 1000.0], "nan")).all()
+    assert func(0.1) == pytest.approx(1e-38)
+    # scalars go through their own path, with the same results as arrays
+    masses = [0.0, -1.0, np.nan, np.inf, 1e-300, 0.1, 5.0, 1000.0, 1e300]
+    for func in (func, loglog([1.0, 10.0], [1e-40, 1e-50]), loglog([2.0], [1e-40]), loglog([1.0, 10.0], [1e-40, 1e-40])):
+        for extrapolate in ("power", "clamp", "nan"):
+            expected = func(np.array(masses), extrapolate)
+            assert np.allclose([func(x, extrapolate) for x in masses], expected, rtol=1e-12, equal_nan=True)
+    assert (m.DD(1006).sigma(np.logspace(-2, 6, 100)) > 0).all()
+
+def test_width_kernels():
+    width = m.theory.width
+    med_mass = np.logspace(-3, 4, 1000)
+    # reference: per-flavour complex evaluation
+    reference = 0
+    for mass in width._q_mass:
+        z = (np.divide(mass, med_mass)**2).astype(np.complex128)
+        reference += np.where(med_mass >= 2 * mass, 0.09 * med_mass * np.sqrt(1 - 4*z) * (1 + 2*z) / (4*np.pi), 0.0)
+    assert np.allclose(width.vector_qq(med_mass, 0.3), np.abs(reference), rtol=1e-12)
+
+    total = width.vector_qq(med_mass, 0.25) + width.vector_ll(med_mass, 0.1)
+    total += width.vector_nn(med_mass, 0.1) + width.vector_dm(med_mass, 10.0, 1.0)
+    out = np.empty_like(med_mass)
+    work = np.empty((10,) + med_mass.shape)
+    assert width.vector_total(med_mass, 10.0, 0.25, 1.0, 0.1, out=out, work=work) is out
+    assert np.allclose(out, total, rtol=1e-12)
+
+    g_q = np.array([[0.1], [0.25], [1.0]])
+    assert np.allclose(width.axial_total(med_mass, 10.0, g_q)[1], width.axial_total(med_mass, 10.0), rtol=1e-12)
+    assert np.isfinite(width.pseudo_scalar_total(np.array([100.0, 500.0]), 10.0)).all()
+
+def test_grid_scan(tmp_path):
+    med_mass = np.linspace(100, 3000, 30)
+    chi_mass = np.linspace(1, 1000, 20)
+    g_q = np.array([0.1, 0.25])
+    res = grid.scan("vector", med_mass, chi_mass, g_q=g_q, chunk_size=100)
+    assert res.width.shape == (30, 20, 2, 1, 1)
+    expected = m.theory.width.vector_total(med_mass[:, None], chi_mass[None, :], 0.25, 1.0, 0.0)
+    assert np.allclose(res.width[:, :, 1, 0, 0], expected, rtol=1e-12)
+    assert np.allclose(res.ratio[:, :, 1, 0, 0], expected / med_mass[:, None])
+    mesh = np.meshgrid(med_mass, chi_mass, indexing="ij")
+    assert np.allclose(res.sigma[:, :, 0, 0, 0], m.SI(g_quark=0.1).sigma(*mesh))
+
+    on_disk = grid.scan("vector", med_mass, chi_mass, g_q=g_q, chunk_size=64, out=tmp_path)
+    assert np.array_equal(np.load(tmp_path / "sigma.npy"), res.sigma)
+    assert len(on_disk.to_frame()) == res.width.size
+
+def test_lazy_import():
+    probe = (
+        "import sys, lhctodd; "
+        "print(sorted(m for m in ('matplotlib', 'scipy', 'pandas', 'prettytable', 'lmdb') if m in sys.modules)); "
+        "print(isinstance(vars(lhctodd.theory.width)['_as'], lhctodd.tools.lazy_attribute))"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True)
+    assert output.stdout.split() == ["[]", "True"]
+
+def test_streaming_translation(tmp_path):
+    rng = np.random.default_rng(0)
+    masses = np.column_stack([rng.uniform(100, 3000, 1001), rng.uniform(1, 1000, 1001)])
+    np.save(tmp_path / "limit.npy", masses)
+    np.savetxt(tmp_path / "limit.csv.gz", masses, delimiter=",")
+    model = m.SI(g_chi=1.0, g_quark=0.25)
+    expected = model.from_array(masses[:,0], masses[:,1])
+
+    assert model.translate(tmp_path / "limit.npy", tmp_path / "out.npy", chunk_size=100) == 1001
+    assert np.array_equal(np.load(tmp_path / "out.npy"), expected)
+    assert model.translate(tmp_path / "limit.csv.gz", tmp_path / "out.csv", chunk_size=64) == 1001
+    np.testing.assert_array_equal(np.loadtxt(tmp_path / "out.csv", delimiter=","), expected)
+    chunks = [block.shape for block in model.stream(tmp_path / "limit.npy", chunk_size=500)]
+    assert chunks == [(500, 2), (500, 2), (1, 2)]
+    assert np.allclose(model.from_csv(tmp_path / "limit.csv.gz"), expected)
+
+def test_batch_translation(tmp_path):
+    masses = np.column_stack([np.linspace(100, 3000, 200), np.linspace(1, 1000, 200)])
+    np.savetxt(tmp_path / "limit.csv", masses, delimiter=",")
+    jobs = [
+        {"input": str(tmp_path / "limit.csv"), "model": "SD", "g_quark": 0.25},
+        {"input": str(tmp_path / "missing.csv"), "model": "SI"},
+        {"input": str(tmp_path / "limit.csv"), "model": "SI", "g_quark": 1.0, "output": "si.csv"},
+    ]
+    for processes in (None, 2):
+        results = translate_batch(jobs, tmp_path / "out", processes=processes, progress=None)
+        assert [result["status"] for result in results] == ["ok", "error", "ok"]
+        assert np.allclose(np.load(results[0]["output"]), m.SD().from_array(masses[:,0], masses[:,1]))
+        assert np.allclose(
+            np.loadtxt(tmp_path / "out" / "si.csv", delimiter=","),
+            m.SI(g_quark=1.0).from_array(masses[:,0], masses[:,1])
+        )
+    assert (tmp_path / "out" / "index.json").exists()
+
+def _crash(job, chunk_size):
+    os._exit(1)
+
+def test_batch_broken_pool(tmp_path, monkeypatch):
+    # a dead worker fails its jobs instead of the whole batch
+    from lhctodd import batch
+    monkeypatch.setattr(batch, "run_job", _crash)
+    jobs = [{"input": str(tmp_path / "limit.csv"), "model": "SD"}] * 2
+    results = translate_batch(jobs, tmp_path / "out", processes=2, progress=None)
+    assert [result["status"] for result in results] == ["error", "error"]
+    assert "BrokenProcessPool" in results[0]["error"]
+
+def test_cli(capsys, tmp_path, monkeypatch):
+    assert cli(["sigma", "1006", "100", "--format", "csv"]) == 0
+    rows = capsys.readouterr().out.split()
+    assert rows[0] == "id,mass,sigma"
+    assert float(rows[1].split(",")[2]) == pytest.approx(m.DD(1006).sigma(100))
+
+    assert cli(["list", "--type", "SD", "--format", "json"]) == 0
+    assert [row["id"] for row in json.loads(capsys.readouterr().out)] == m.query(type="SD")
+
+    assert cli(["envelope", "--masses", "100", "--format", "json"]) == 0
+    assert json.loads(capsys.readouterr().out)[0]["expr"] == "XENON1T"
+
+    np.savetxt(tmp_path / "limit.csv", [[1000.0, 10.0], [2000.0, 100.0]], delimiter=",")
+    assert cli(["translate", str(tmp_path / "limit.csv"), str(tmp_path / "out.npy"), "--model", "SD"]) == 0
+    assert np.load(tmp_path / "out.npy").shape == (2, 2)
+    assert cli(["show", "99999"]) == 1
+
+    def unreadable(limit_id):
+        raise lmdb.ReadersFullError("reader table full")
+    monkeypatch.setattr(m.registry, "get", unreadable)
+    assert cli(["show", "1006"]) == 1
+    assert "reader table full" in capsys.readouterr().err
+
+def test_ingest(tmp_path):
+    meta = {"type": "SI", "expr": "XENONnT", "name": "XENONnT", "cite": "2303.14729", "year": 2023}
+    np.savetxt(tmp_path / "xenonnt.csv", [[10.0, 1e-46], [100.0, 3e-47], [1000.0, 2e-46]], delimiter=",")
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump([dict(meta, file="xenonnt.csv")], f)
+
+    db = tmp_path / "db"
+    assert ingest(tmp_path / "manifest.json", db) == {"added": [1000], "updated": [], "unchanged": []}
+    assert ingest(tmp_path / "manifest.json", db)["unchanged"] == [1000]
+    changed = [(meta, [[10.0, 1e-46], [100.0, 4e-47], [1000.0, 2e-46]])]
+    assert ingest(changed, db)["updated"] == [1000]
+
+    registry = limit_registry(db)
+    assert registry.query(type="SI", expr="XENON", year_min=2023) == [1000]
+    assert registry.get(1000).get_limit()[1, 1] == 4e-47
+    # reads never take the writer lock, writing reopens the database
+    assert registry.env.flags()["readonly"]
+    # records and DD read before a write stay usable
+    record = registry.get(1000)
+    path = m.registry.path
+    m.registry.reload(db)
+    try:
+        limit = m.DD(1000)
+        assert ingest([(dict(meta, name="other"), [[1.0, 1e-45], [10.0, 1e-46]])], db)["added"] == [1001]
+        assert limit.data()[1, 1] == record.get_limit()[1, 1] == 4e-47
+        assert m.registry.query(name="other") == registry.query(name="other") == [1001]
+    finally:
+        m.registry.reload(path)
+    with pytest.raises(ValueError):
+        ingest([(meta, [[10.0, 1e-46], [5.0, np.nan]])], db)
+
+def _child_sigma(limit_id):
+    return m.registry.interpolator(limit_id)(50.0)
+
+def test_concurrent_access():
+    import concurrent.futures
+    import multiprocessing
+    ids = m.registry.keys()
+    expected = {limit_id: m.DD(limit_id).sigma(50.0) for limit_id in ids}
+
+    registry = limit_registry(maxsize=4, readers=4)
+    def lookup(i):
+        limit_id = ids[i % len(ids)]
+        if i % 97 == 0:
+            registry.reload()
+        assert registry.query(type=registry.get(limit_id).type)
+        return limit_id, registry.interpolator(limit_id)(50.0)
+    with concurrent.futures.ThreadPoolExecutor(16) as pool:
+        for limit_id, sigma in pool.map(lookup, range(2000)):
+            assert sigma == expected[limit_id]
+    assert len(registry._pool) <= registry.readers
+
+    # workers forked after the parent opened the database start over
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        assert pool.map(_child_sigma, ids) == [expected[limit_id] for limit_id in ids]
+    assert m.registry.get(ids[0]).get_limit().shape[1] >= 2
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_fork_readers():
+    # forked children read through their own environment, more of them than
+    # the reader table holds do not fill it with slots stamped with our pid
+    env = m.registry.env
+    expected = m.registry.interpolator(1006)(50.0)
+    limit = m.DD(1006)
+    data = limit.data().copy()
+    for _ in range(env.max_readers() + 4):
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                ok = m.registry.query(type="SI") and m.registry.interpolator(1006)(50.0) == expected
+                # limits made before the fork stay usable
+                ok = ok and np.array_equal(limit.data(), data) and len(limit.to_pandas()) == len(data)
+            finally:
+                os._exit(0 if ok else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+    env.reader_check()
+    slots = [line for line in env.readers().splitlines()[1:] if line.strip()]
+    assert len(slots) <= m.registry.readers + 1
+    assert m.registry.interpolator(1006)(50.0) == expected
+
+def test_pickle_models():
+    import concurrent.futures
+    limit = m.DD(1006, extrapolate="nan")
+    data = pickle.dumps(limit)
+    assert len(data) < 100
+    copy = pickle.loads(data)
+    assert copy.id == 1006 and copy.extrapolate == "nan"
+    assert copy.sigma(1e6) != copy.sigma(1e6)
+
+    model = m.SD(g_chi=1.0, g_quark=0.1, label="monoz")
+    model.from_array(np.full(10**5, 1000.0), np.full(10**5, 50.0))
+    data = pickle.dumps(model)
+    assert len(data) < 200
+    assert pickle.loads(data).sigma(1000.0, 50.0) == model.sigma(1000.0, 50.0)
+
+    masses = [10.0, 100.0, 1000.0]
+    with concurrent.futures.ProcessPoolExecutor(2) as pool:
+        np.testing.assert_array_equal(list(pool.map(limit.sigma, masses)), [limit.sigma(mass) for mass in masses])
+
+def test_serve():
+    import asyncio
+    import threading
+    import urllib.error
+    import urllib.request
+    from lhctodd.serve import limit_server
+
+    server = limit_server(cache_size=8)
+    async def concurrent():
+        requests = [
+            server.respond("POST", "/sigma", json.dumps({"id": 1006, "mass": [10.0 * (i + 1), 500.0]}).encode())
+            for i in range(20)
+        ]
+        return await asyncio.gather(*requests)
+    responses = asyncio.run(concurrent())
+    assert [status for status, _ in responses] == [200] * 20
+    assert json.loads(responses[3][1])["sigma"] == m.DD(1006).sigma(np.array([40.0, 500.0])).tolist()
+    stats = json.loads(asyncio.run(server.respond("GET", "/stats"))[1])
+    assert stats["requests"] == 20 and stats["batches"] == 1
+    assert not server._sigma._tasks
+    # unexpected failures still get an answer
+    status, data = asyncio.run(limit_server(registry=object()).respond("GET", "/limits/1006"))
+    assert status == 500 and "AttributeError" in json.loads(data)["error"]
+
+    loop = asyncio.new_event_loop()
+    listening = loop.run_until_complete(server.start(port=0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{listening.sockets[0].getsockname()[1]}"
+    try:
+        def get(path, body=None):
+            with urllib.request.urlopen(url + path, data=body) as response:
+                return json.load(response)
+        assert [row["id"] for row in get("/limits?type=SI&expr=XENON")] == m.query(type="SI", expr="XENON")
+        assert get("/limits/1006")["cite"] == "1805.12562"
+        assert get("/sigma?id=1006&mass=100,1000")["sigma"] == m.DD(1006).sigma(np.array([100.0, 1000.0])).tolist()
+        get("/sigma?id=1006&mass=100,1000")
+        translated = get("/translate", json.dumps({"model": "SD", "med_mass": [1000.0], "chi_mass": [50.0]}).encode())
+        assert translated["sigma"] == [m.SD().sigma(1000.0, 50.0)]
+        assert get("/stats")["cache_hits"] == 1
+        for path in ("/limits/99999", "/sigma?id=1006&mass=abc", "/nowhere"):
+            with pytest.raises(urllib.error.HTTPError):
+                get(path)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        listening.close()
+        loop.run_until_complete(listening.wait_closed())
+        loop.close()
+
+def test_rescale():
+    from lhctodd import rescale
+    width = m.theory.width
+    med_mass = np.geomspace(100, 5000, 60)
+    chi_mass = np.array([1.0, 50.0, 200.0])
+    mu = np.broadcast_to((med_mass[:, None] / 1500.0)**3, (60, 3))
+
+    ratio = rescale.yield_ratio("vector", 1000.0, 50.0, g_q=[0.25, 0.5], g_chi=1.0)
+    expected = (0.5**2 / width.vector_total(1000.0, 50.0, 0.5)) / (0.25**2 / width.vector_total(1000.0, 50.0, 0.25))
+    assert np.allclose(ratio, [1.0, expected], rtol=1e-12)
+    assert np.isclose(rescale.yield_ratio("axial", 100.0, 200.0, 0.5, 1.0), 4.0)
+
+    res = rescale.translate("vector", med_mass, chi_mass, mu, g_q=np.linspace(0.05, 0.5, 10), g_chi=1.0)
+    assert res.sigma.shape == (10, 3) and len(res) == 10
+    assert np.allclose(res.med_mass[np.isclose(res.couplings[:,0], 0.25)], 1500.0)
+    assert (np.diff(res.med_mass[:, 0]) > 0).all()
+    assert np.allclose(res.sigma[3], m.SI(g_quark=res.couplings[3, 0]).sigma(res.med_mass[3], chi_mass))
+    assert res.limit(3).shape == (3, 2)
+    assert np.isnan(rescale.translate("vector", med_mass, chi_mass, mu + 10, 0.25, 1.0).sigma).all()
+    assert np.array_equal(rescale.from_points([[1, 1, 0.5], [2, 1, 1.5], [1, 2, 0.7], [2, 2, 2.0]])[2], [[0.5, 0.7], [1.5, 2.0]])
+
+def test_tabulated_width(tmp_path, monkeypatch):
+    from lhctodd.tabulate import MAX_RELATIVE_ERROR, fingerprint, width_table
+    width = m.theory.width
+    table = width_table.load(cache_dir=tmp_path)
+    assert max(table.max_relative_error.values()) < MAX_RELATIVE_ERROR
+    assert list(tmp_path.glob(f"widths-{fingerprint()}-*.npz"))
+    assert width_table.load(cache_dir=tmp_path) is table
+
+    med_mass = np.geomspace(1e-2, 2e5, 20000)
+    for name in ("vector_total", "axial_total", "scalar_total", "pseudo_scalar_total"):
+        exact = getattr(width, name)(med_mass, 1.0, 0.5)
+        assert np.allclose(getattr(table, name)(med_mass, 1.0, 0.5), exact, rtol=MAX_RELATIVE_ERROR, atol=0)
+    assert table.scalar_gg(300.0) == 0.0 and np.isclose(table.scalar_qq(2e5, 0.3), width.scalar_qq(2e5, 0.3))
+
+    monkeypatch.setenv("LHCTODD_CACHE", str(tmp_path))
+    med_mass, chi_mass = np.linspace(100, 3000, 30), np.linspace(1, 1000, 20)
+    fast = grid.scan("scalar", med_mass, chi_mass, backend="tabulated")
+    assert np.allclose(fast.width, grid.scan("scalar", med_mass, chi_mass).width, rtol=MAX_RELATIVE_ERROR)
+
+def test_world_envelope(tmp_path):
+    from lhctodd import world
+    si = m.envelope("SI")
+    mass = np.geomspace(1, 1e4, 50)
+    best, winner = m.LimitStack(type="SI").envelope(mass)
+    assert np.allclose(si.sigma(mass), best, rtol=1e-2)
+    assert (si.winners(mass) == winner).mean() > 0.9
+    assert si.experiments([100])[0] == "XENON1T"
+    assert np.isnan(si.sigma(1e-3)) and pickle.loads(pickle.dumps(si)).type == "SI"
+
+    def limit(low, high, scale):
+        mass = np.geomspace(low, high, 20)
+        return [[x, scale * x * 1e-47] for x in mass]
+    db = tmp_path / "db"
+    meta = {"type": "SI", "expr": "A", "name": "A", "cite": "1", "year": 2020}
+    ingest([(meta, limit(1, 1000, 1.0)), (dict(meta, expr="B", name="B", cite="2"), limit(10, 1e4, 2.0))], db)
+    registry = limit_registry(db)
+    before = world.load("SI", registry).get_limit().copy()
+    handle = registry.envelopes
+    assert handle is not None and registry.envelopes is handle
+    ingest([(dict(meta, expr="C", name="C", cite="3"), limit(50, 200, 0.1))], db)
+    registry.reload()
+    assert registry._envelopes is None
+    after = world.load("SI", registry).get_limit()
+    inside = (world.GRID >= 50) & (world.GRID <= 200)
+    assert np.array_equal(after[~inside], before[~inside], equal_nan=True)
+    assert (after[inside, 2] == 1002).all()
+    best, winner = m.LimitStack(registry=registry, type="SI").envelope(world.GRID)
+    assert np.allclose(after[:,1], best, equal_nan=True) and np.array_equal(after[:,2], winner)
+
+def test_limit_pack(tmp_path):
+    frame = m.to_frame()
+    assert list(frame.columns) == ["id", "type", "expr", "name", "cite", "year", "mass", "sigma"]
+    assert len(frame) == sum(len(data.get_limit()) for _, data in m.registry.records())
+    assert (frame[frame.id == 1006].sigma.to_numpy() == m.DD(1006).data()[:,1]).all()
+    assert m.DD(1006).to_pandas().shape == (len(m.DD(1006).data()), 2)
+
+    assert m.pack.export_pack(tmp_path / "si.npz", type="SI") == len(m.query(type="SI"))
+    pack = m.pack.load_pack(tmp_path / "si.npz")
+    assert isinstance(pack.mass, np.memmap)
+    assert pack.year.dtype == np.int64 and pack.year[pack.row(1006)] == int(m.registry.get(1006).year)
+    assert (pack.get_limit(1006) == m.DD(1006).data()[:,:2]).all()
+    assert (pack.to_frame().reset_index(drop=True) == m.to_frame(type="SI")).all().all()
+    assert (np.load(tmp_path / "si.npz")["offsets"] == pack.offsets).all()
+    with pytest.raises(KeyError):
+        pack.get_limit(99999)
+
+def test_compare():
+    chi = np.geomspace(1, 2000, 50)
+    curves = [np.column_stack([1e-44 * (chi / 10)**k, chi]) for k in (0.5, 1, 2)]
+    stack = m.LimitStack([1003, 1006])
+    res = m.compare(curves, stack)
+    assert res.ratio.shape == (3, 2, len(res.mass))
+
+    crossings = res.crossings()
+    for row in crossings.itertuples():
+        curve = curves[row.curve]
+        lhc = np.exp(np.interp(np.log(row.mass), np.log(curve[:,1]), np.log(curve[:,0])))
+        assert np.isclose(lhc, m.DD(row.id).sigma(row.mass), rtol=1e-9)
+
+    intervals = res.intervals()
+    assert set(intervals.stronger) <= {"LHC", "DD"}
+    assert (intervals.mass_min < intervals.mass_max).all()
+    # interval edges inside the overlap are the crossings
+    inner = intervals[intervals.stronger == "DD"]
+    assert np.allclose(np.sort(inner.mass_min), np.sort(crossings.mass[crossings.stronger_above == "DD"]))
+
+def test_instrument(tmp_path):
+    assert not m.instrument.enabled
+    m.registry.reload()
+    with m.instrument.collect(trace=tmp_path / "trace.json") as stats:
+        m.DD(1006).sigma(100.0)
+        m.theory.width.vector_total(np.geomspace(10, 1000, 500), 10.0)
+        m.theory.width.vector_qq(100.0)
+    assert not m.instrument.enabled
+    assert stats["lmdb.begin"]["calls"] >= 1
+    assert stats["records.decoded"]["bytes"] > 0
+    assert any(name.startswith("interp.built") for name in stats)
+    assert stats["width.vector_qq[n<=1e0]"]["calls"] == 1
+    assert stats["width.vector_total[n<=1e3]"]["calls"] == 1
+    assert set(stats) <= set(m.stats())
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert {event["name"] for event in events} == set(stats)
+
+    # nothing counted when disabled
+    before = m.stats()
+    m.theory.width.vector_qq(100.0)
+    assert m.stats() == before
+
+def test_plotting():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from lhctodd.plotting import decimate, lttb
+
+    x = np.geomspace(1, 1e4, 100_000)
+    y = 1e-46 * (x / 30)**1.5 + 1e-44 * (x / 3)**-6
+    y[50_000] *= 100  # spike kept by LTTB
+    mx, my = decimate(x, y, 500)
+    assert len(mx) == 500
+    assert (mx[0], mx[-1]) == (x[0], x[-1])
+    assert my.max() == y.max()
+    assert (np.diff(lttb(np.arange(10.0), np.arange(10.0), 4)) > 0).all()
+
+    fig, ax = plt.subplots()
+    collection = m.plot_all("SI", ax=ax)
+    assert len(collection.get_segments()) == len(m.query(type="SI"))
+    assert len(ax.get_legend_handles_labels()[1]) == len(m.query(type="SI"))
+    assert ax.get_xscale() == ax.get_yscale() == "log"
+    collection = m.DD(1006).plot(ax=ax, max_points=10)
+    assert len(collection.get_segments()[0]) == 10
+    plt.close(fig)
+
+def test_uncertainty_bands():
+    model = m.SI(g_chi=1.0, g_quark=0.25)
+    med_mass = np.geomspace(100, 3000, 300)
+    chi_mass = med_mass / 3
+    assert np.allclose(model.sigma(med_mass[:, None], chi_mass[None, :5]).shape, (300, 5))
+
+    band = model.bands(med_mass, chi_mass, n_samples=20000, normalisation=0.1, seed=3)
+    assert band.values.shape == (5, 300)
+    # log-normal normalisation only: quantiles are exp(0.1 * z_q) times the nominal
+    assert np.allclose(band[0.16] / band.nominal, np.exp(-0.1), rtol=0.01)
+    assert np.allclose(band[0.5] / band.nominal, 1.0, atol=0.01)
+    assert (np.diff(band.values, axis=0) >= 0).all()
+
+    # same seed, same band whatever the chunking
+    error = np.linspace(0.01, 0.1, 300)
+    for correlated in (True, False):
+        kwargs = dict(n_samples=500, med_mass_error=error, correlated=correlated, seed=7)
+        a = model.bands(med_mass, chi_mass, max_elements=1 << 20, **kwargs)
+        b = model.bands(med_mass, chi_mass, max_elements=500 * 64, **kwargs)
+        np.testing.assert_array_equal(a.values, b.values)
+        # larger mass errors give wider bands
+        width = a[0.975] / a[0.025]
+        assert width[-1] > width[0]
+
+    with pytest.raises(ValueError):
+        m.SD().bands()
+
+def test_inverse_contours():
+    model = m.SI(g_chi=1.0, g_quark=0.25)
+    contours = m.inverse.contours(model, [1003, 1006], g_quark=[0.1, 0.25, 1.0])
+    assert contours.med_mass.shape == (3, 2, len(contours.chi_mass))
+    assert (contours.couplings[:, 1] == 1.0).all()
+
+    # the translated contour maps back onto the limit
+    med_mass, chi_mass = contours.contour(1, 1).T
+    assert np.allclose(model.sigma(med_mass, chi_mass), m.DD(1006).sigma(chi_mass), rtol=1e-10)
+    # stronger couplings reach heavier mediators
+    covered = ~np.isnan(contours.med_mass[0])
+    assert (contours.med_mass[2][covered] > contours.med_mass[0][covered]).all()
+
+    world = m.inverse.contours(m.SD, m.envelope("SD"), chi_mass=[10.0, 100.0])
+    assert world.med_mass.shape == (1, 1, 2)
+    # only the covered envelope points, without the id column
+    stack = m.inverse._stack([m.envelope("SD")])
+    assert stack.size[0] == len(m.envelope("SD").data()) and stack.expr[0] == "envelope"
+    frame = contours.to_frame()
+    assert len(frame) == np.isfinite(contours.med_mass).sum()
+    assert set(frame.id) == {1003, 1006}
+
 def test_thoery():
     # check alpha_s
     print("as(MZ) = ", m.theory.width._as(9.1200000e+01))